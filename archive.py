@@ -0,0 +1,173 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+import datetime
+import re
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+from astropy import units as u
+from astropy.time import Time
+
+from batch import REGEX_INPUT
+from rotate import PERIOD_TOLERANCE
+from util import logger, open_skd, read_header, SIDEREAL_RATE, SIDEREAL_DAY
+
+# name of index database in archive directory
+INDEX = ".change_date_skd.sqlite"
+
+# number of bins of scan GMST histogram (1 minute resolution)
+N_BINS = 1440
+
+REGEX_SCAN = re.compile(rb"PREOB\s+(\d{11})")
+
+
+def build_index(directory, path_index=None):
+    """
+    index start GMST, session length and scan GMST histogram of all .skd files (possibly compressed) in a directory
+
+    outputs of this tool (code_gmst.skd, code_rot_yyyymmddhhmmss.skd, ...) are skipped
+
+    files that did not change since the last run (same size and modification time) are not read again, entries of
+    deleted files are removed
+
+    :param directory: archive directory with .skd files
+    :param path_index: path to index database (default = directory/.change_date_skd.sqlite)
+    :return: path to index database
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        logger.critical(f'The following directory {directory.absolute()} was not found')
+        raise FileNotFoundError(f'The following directory {directory.absolute()} was not found')
+    path_index = Path(path_index) if path_index is not None else directory / INDEX
+
+    # commit transaction and close connection (sqlite3 connection context only commits)
+    with closing(sqlite3.connect(path_index)) as db, db:
+        db.execute("CREATE TABLE IF NOT EXISTS schedules (file TEXT PRIMARY KEY, size INTEGER, mtime REAL, "
+                   "experiment TEXT, start TEXT, hours REAL, gmst REAL, scans INTEGER, histogram BLOB)")
+        known = {row[0]: (row[1], row[2]) for row in db.execute("SELECT file, size, mtime FROM schedules")}
+
+        # outputs of this tool are not indexed
+        files = [p for p in sorted(directory.iterdir()) if p.is_file() and REGEX_INPUT.match(p.name)]
+        names = {p.name for p in files}
+        removed = [name for name in known if name not in names]
+        db.executemany("DELETE FROM schedules WHERE file = ?", [(name,) for name in removed])
+
+        rows = []
+        for path_skd in files:
+            stat = path_skd.stat()
+            if known.get(path_skd.name) == (stat.st_size, stat.st_mtime):
+                continue
+            experiment, start, end = read_header(path_skd)
+            if start is None or end is None:
+                logger.warning(f"{path_skd.name} has no session start or end time, skipped")
+                continue
+            rows.append([path_skd.name, stat.st_size, stat.st_mtime, experiment, start,
+                         (end - start).total_seconds() / 3600, scan_times(path_skd, start)])
+
+        if rows:
+            # compute GMST of all session starts and scans at once
+            starts = Time([row[4] for row in rows], scale='utc')
+            n_scans = [len(row[6]) for row in rows]
+            scan_starts = starts[np.repeat(np.arange(len(rows)), n_scans)] + np.concatenate(
+                [row[6] for row in rows]) * u.s
+            gmst = starts.sidereal_time('mean', 'greenwich').to_value('hourangle')
+            scan_gmst = np.split(scan_starts.sidereal_time('mean', 'greenwich').to_value('hourangle'),
+                                 np.cumsum(n_scans)[:-1])
+            for row, g, s in zip(rows, gmst, scan_gmst):
+                histogram = np.bincount((s / 24 * N_BINS).astype(int) % N_BINS, minlength=N_BINS)
+                row[4] = row[4].isoformat()
+                row[6:] = [float(g), len(s), histogram.astype(np.uint32).tobytes()]
+            db.executemany("INSERT OR REPLACE INTO schedules VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    logger.info(f"indexed {len(rows)} new or changed .skd files, removed {len(removed)} ({path_index.absolute()})")
+    return path_index
+
+
+def scan_times(path_skd, start):
+    """
+    start times of all scans in $SKED block in seconds since session start
+
+    :param path_skd: path to .skd file
+    :param start: session start time
+    :return: numpy array
+    """
+    with open_skd(path_skd, 'rb') as f:
+        data = f.read()
+    begin = data.find(b"\n$SKED")
+    if begin == -1:
+        return np.zeros(0)
+    end = data.find(b"\n$", begin + 1)
+    end = len(data) if end == -1 else end
+    times = [datetime.datetime.strptime(t.decode(), '%y%j%H%M%S') for t in REGEX_SCAN.findall(data, begin, end)]
+    return np.array([(t - start).total_seconds() for t in times])
+
+
+def query_index(path_index, target, approach="gmst", number=5):
+    """
+    find archived schedules that fit a target start time best, based on the index only
+
+    for approach 'gmst', schedules are ranked by the shift between target time and the new GMST preserving start
+    time; for approach 'rotate', schedules of at least one sidereal day are ranked by the GMST offset between target
+    start and the closest scan (1 minute resolution)
+
+    :param path_index: path to index database or archive directory
+    :param target: target start time
+    :param approach: approach to rank for ['gmst', 'rotate'] (default = 'gmst')
+    :param number: maximum number of candidates (default = 5)
+    :return: list of dictionaries with keys "file", "experiment", "start", "hours", "gmst" and "score" (hours)
+    """
+    path_index = Path(path_index)
+    if path_index.is_dir():
+        path_index = path_index / INDEX
+    if not path_index.is_file():
+        logger.critical(f'The following index {path_index.absolute()} was not found')
+        raise FileNotFoundError(f'The following index {path_index.absolute()} was not found')
+
+    with closing(sqlite3.connect(path_index)) as db, db:
+        rows = db.execute("SELECT file, experiment, start, hours, gmst, histogram FROM schedules").fetchall()
+    if approach == "rotate":
+        # only sessions of at least one sidereal day can be rotated
+        rows = [row for row in rows if row[3] * 3600 + PERIOD_TOLERANCE >= SIDEREAL_DAY]
+    if not rows:
+        return []
+
+    target_gmst = Time(target, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+    if approach == "gmst":
+        gmst = np.array([row[4] for row in rows])
+        score = np.abs((gmst - target_gmst + 12) % 24 - 12) / SIDEREAL_RATE
+    elif approach == "rotate":
+        histogram = np.frombuffer(b"".join(row[5] for row in rows), dtype=np.uint32).reshape(len(rows), N_BINS)
+        centers = (np.arange(N_BINS) + 0.5) * 24 / N_BINS
+        distance = np.abs((centers - target_gmst + 12) % 24 - 12)
+        score = np.where(histogram > 0, distance, np.inf).min(axis=1)
+    else:
+        raise ValueError(f"approach '{approach}' not supported")
+
+    best = np.argsort(score, kind='stable')[:number]
+    return [{"file": str(path_index.parent / rows[i][0]), "experiment": rows[i][1], "start": rows[i][2],
+             "hours": rows[i][3], "gmst": rows[i][4], "score": float(score[i])} for i in best]
+
+
+if __name__ == "__main__":
+    from util import initialize_logging
+
+    initialize_logging()
+    build_index(Path('test'))
+    for c in query_index(Path('test'), datetime.datetime(2021, 7, 9, 18, 0, 0), "rotate"):
+        print(c)
@@ -0,0 +1,224 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from gmst import update_skd_based_on_gmst
+from rotate import rotate_schedule_skd
+from sky import rotate_sky_skd
+from util import logger, read_skd, write_skd, output_path, __version__
+
+# transformation and output file suffix per approach
+APPROACHES = {"gmst": (update_skd_based_on_gmst, "_gmst"),
+              "sky": (rotate_sky_skd, "_sky"),
+              "rotate": (rotate_schedule_skd, "_rot"),
+              }
+
+# name of manifest file in processed directory
+MANIFEST = ".change_date_skd.json"
+
+# matches .skd files (possibly compressed) that are not output of this tool
+REGEX_INPUT = re.compile(r"^(?!.*_(gmst|sky|rot|trim)(_\d{14}(_\d+)?)?\.skd).*\.skd(\.(gz|xz|zst))?$")
+
+
+def transform(skd, approach, target):
+    """
+    apply one approach to a skd file
+
+    the passed skd file is not changed, thus, it is safe to call this function from multiple threads with the same
+    skd file
+
+    :param skd: skd file
+    :param approach: approach to use ['gmst', 'sky', 'rotate']
+    :param target: target start time (in case of 'gmst' only the date is used)
+    :return: new skd file
+    """
+    approach = approach.lower()
+    if approach not in APPROACHES:
+        raise ValueError(f"approach '{approach}' not supported")
+    function, _ = APPROACHES[approach]
+    if approach == "gmst" and isinstance(target, datetime.datetime):
+        target = target.date()
+    return function(skd, target)
+
+
+def transform_many(jobs, max_workers=None):
+    """
+    apply many transformations concurrently using a thread pool
+
+    :param jobs: iterable of (skd, approach, target) tuples
+    :param max_workers: maximum number of threads (default = ThreadPoolExecutor default)
+    :return: list of new skd files in same order as jobs
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(transform, skd, approach, target) for skd, approach, target in jobs]
+        return [future.result() for future in futures]
+
+
+def process_directory(directory, approach, target, compression=None, force=False, max_workers=None):
+    """
+    apply one approach to all .skd files in a directory, skipping outputs that are already up to date
+
+    a manifest (.change_date_skd.json) in the directory keeps track of input content hash, approach, target,
+    tool version and output path of each processed file. Inputs are only processed again if one of them changed
+    or if the output is missing. The content hash is only computed again if size or modification time of an input
+    changed. Entries of deleted inputs are removed from the manifest.
+
+    :param directory: directory with .skd files
+    :param approach: approach to use ['gmst', 'sky', 'rotate']
+    :param target: target start time (in case of 'gmst' only the date is used)
+    :param compression: compress new .skd files ['gz', 'xz', 'zst'] (default = None)
+    :param force: process all files regardless of manifest (default = False)
+    :param max_workers: maximum number of threads (default = ThreadPoolExecutor default)
+    :return: list of paths to newly written .skd files
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        logger.critical(f'The following directory {directory.absolute()} was not found')
+        raise FileNotFoundError(f'The following directory {directory.absolute()} was not found')
+
+    approach = approach.lower()
+    if approach not in APPROACHES:
+        raise ValueError(f"approach '{approach}' not supported")
+    _, suffix = APPROACHES[approach]
+    if approach == "gmst" and isinstance(target, datetime.datetime):
+        target = target.date()
+
+    manifest_path = directory / MANIFEST
+    manifest = {}
+    if manifest_path.is_file():
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        # remove entries of deleted files
+        manifest = {k: v for k, v in manifest.items() if (directory / k.rsplit(":", 1)[0]).is_file()}
+
+    todo = []
+    for path_skd in sorted(directory.iterdir()):
+        if not path_skd.is_file() or not REGEX_INPUT.match(path_skd.name):
+            continue
+        out = output_path(path_skd, suffix, compression)
+        key = f"{path_skd.name}:{approach}"
+        previous = manifest.get(key, {})
+        stat = path_skd.stat()
+        # content hash is only computed again if size or modification time changed
+        if previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+            content_hash = previous["hash"]
+        else:
+            content_hash = file_hash(path_skd)
+        entry = {"hash": content_hash,
+                 "approach": approach,
+                 "target": str(target),
+                 "version": __version__,
+                 "output": out.name,
+                 "size": stat.st_size,
+                 "mtime": stat.st_mtime,
+                 }
+        unchanged = all(previous.get(k) == v for k, v in entry.items() if k not in ["size", "mtime"])
+        if not force and unchanged and out.is_file():
+            manifest[key] = entry
+            logger.debug(f"{path_skd.name} is up to date")
+            continue
+        todo.append((key, entry, path_skd, out))
+
+    logger.info(f"processing {len(todo)} .skd files in {directory.absolute()} ({approach}, {target})")
+    written = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_process_file, path_skd, out, approach, target, compression)
+                   for _, _, path_skd, out in todo]
+        for (key, entry, path_skd, out), future in zip(todo, futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"processing {path_skd.name} failed ({type(e).__name__}: {e})")
+                manifest.pop(key, None)
+                continue
+            manifest[key] = entry
+            written.append(out)
+
+    # write to temporary file first, an interrupted write never leaves a truncated manifest behind
+    tmp = manifest_path.with_name(f"{MANIFEST}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, manifest_path)
+    return written
+
+
+def watch_directory(directory, approach, target, compression=None, interval=10, iterations=None):
+    """
+    poll a directory and process new or changed .skd files as they arrive (see process_directory)
+
+    :param directory: directory with .skd files
+    :param approach: approach to use ['gmst', 'sky', 'rotate']
+    :param target: target start time (in case of 'gmst' only the date is used)
+    :param compression: compress new .skd files ['gz', 'xz', 'zst'] (default = None)
+    :param interval: polling interval in seconds (default = 10)
+    :param iterations: number of polls (default = None, poll until interrupted)
+    :return: None
+    """
+    logger.info(f"watching {Path(directory).absolute()} (polling every {interval} seconds)")
+    iteration = 0
+    while iterations is None or iteration < iterations:
+        if iteration > 0:
+            time.sleep(interval)
+        for out in process_directory(directory, approach, target, compression):
+            logger.info(f"output new .skd file to {out.absolute()}")
+        iteration += 1
+
+
+def _process_file(path_skd, out, approach, target, compression):
+    """
+    read, transform and write one .skd file
+
+    :param path_skd: path to input .skd file
+    :param out: path to output .skd file
+    :param approach: approach to use ['gmst', 'sky', 'rotate']
+    :param target: target start time
+    :param compression: compress new .skd file ['gz', 'xz', 'zst']
+    :return: None
+    """
+    skd = transform(read_skd(path_skd), approach, target)
+    write_skd(out, skd, compression)
+
+
+def file_hash(path):
+    """
+    SHA-256 hash of file content
+
+    :param path: path to file
+    :return: hex digest
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+if __name__ == "__main__":
+    from util import initialize_logging
+
+    initialize_logging()
+    with open(Path('test/vo1189.skd')) as f:
+        skd = f.readlines()
+    targets = [datetime.datetime(2021, month, 22, 18, 0, 0) for month in range(1, 13)]
+    results = transform_many([(skd, approach, t) for approach in APPROACHES for t in targets])
@@ -19,16 +19,18 @@ from pathlib import Path
 
 from astropy.time import Time
 
-from util import logger, find_start_time, update_skd_times
+from util import logger, open_skd, iter_skd, write_skd, output_path, find_start_time, update_skd_times, update_times
 
 
-def update_based_on_gmst(path_skd, date):
+def update_based_on_gmst(path_skd, date, compression=None):
     """
     change date in .skd file and adjust start time in a way that GMST of first scan stays the same
     new .skd file will be stored in same folder as the input .skd file with "_gmst" suffix (code_gmst.skd)
+    input and output .skd files can be compressed (gzip, xz or zstd)
 
     :param path_skd: path to skd file that should be manipulated
     :param date: new session start date
+    :param compression: compress new .skd file ['gz', 'xz', 'zst'] (default = None)
     :return: None
     """
 
@@ -38,28 +40,45 @@ def update_based_on_gmst(path_skd, date):
         logger.critical(f'The following skd file {skd.absolute()} was not found')
         raise FileNotFoundError(f'The following skd file {skd.absolute()} was not found')
 
-    # read original .skd
-    skd = []
-    with open(path_skd) as f:
-        skd = f.readlines()
+    # only the header of the original .skd is read to get the start time
+    with open_skd(path_skd) as f:
+        new_start_time = find_start_time_equal_gmst(find_start_time(f), date)
 
+    # stream original .skd to new .skd file
+    out = output_path(path_skd, "_gmst", compression)
+    logger.info(f"output new .skd file to {out.absolute()}")
+    write_skd(out, update_times(iter_skd(path_skd), new_start_time), compression)
+
+
+def update_skd_based_on_gmst(skd, date):
+    """
+    change date of skd file and adjust start time in a way that GMST of first scan stays the same
+
+    :param skd: skd file
+    :param date: new session start date
+    :return: updated copy of skd file (the passed skd file is not changed)
+    """
+    new_start_time = find_start_time_equal_gmst(find_start_time(skd), date)
+
+    # update .skd file with new times
+    return update_skd_times(skd, new_start_time)
+
+
+def find_start_time_equal_gmst(original_start_time, date):
+    """
+    find new session start time at date with same GMST as original session start time
+
+    :param original_start_time: original session start time
+    :param date: new session start date
+    :return: new session start time
+    """
     # get original session start time and GMST
-    original_start_time = find_start_time(skd)
     apy_time = Time(original_start_time, scale='utc')
     sidereal_start_time = apy_time.sidereal_time('mean', 'greenwich')
 
     logger.info(f"session start time in skd file {original_start_time} (GMST {sidereal_start_time:.4f})")
 
-    new_start_time = find_time_equal_gmst(date, sidereal_start_time)
-
-    # update .skd file with new times
-    update_skd_times(skd, new_start_time)
-
-    # write new .skd file
-    out = path_skd.parent / f"{path_skd.stem}_gmst.skd"
-    logger.info(f"output new .skd file to {out.absolute()}")
-    with open(out, 'w') as f:
-        f.write("".join(skd))
+    return find_time_equal_gmst(date, sidereal_start_time)
 
 
 def find_time_equal_gmst(target_date, target_gmst):
@@ -19,10 +19,31 @@ import sys
 from argparse import ArgumentParser
 from pathlib import Path
 
+from archive import build_index, query_index
+from batch import process_directory, watch_directory
 from gmst import update_based_on_gmst
+from plan import plan_gmst_start_times, parse_window
 from rotate import rotate_schedule
+from shared import sweep
 from sky import rotate_sky
-from util import logger, initialize_logging
+from summary import inspect_skd, inspect_directory, write_summaries
+from trim import trim_schedule
+from util import logger, initialize_logging, configure_iers
+
+
+def parse_time(time):
+    """
+    parse time string
+
+    :param time: time in format 'yyyy-mm-dd' or 'yyyy-mm-ddThh:mm:ss'
+    :return: datetime (None if format is unknown)
+    """
+    if len(time) == 19:
+        return datetime.datetime.strptime(time, "%Y-%m-%dT%H:%M:%S")
+    elif len(time) == 10:
+        return datetime.datetime.strptime(time, "%Y-%m-%d")
+    return None
+
 
 if __name__ == "__main__":
     doc = "change the start date of a given .skd file while maintaining the same azimuth/elevation angles. " \
@@ -30,33 +51,122 @@ if __name__ == "__main__":
           "'gmst': change date but keep GMST (start time changes);" \
           "'sky' change date and time (change source location);" \
           "'rotate' change date and time and rotate schedule (change scan order);" \
-          "new .skd file is stored in same folder as passed .skd file (code_gmst.skd, code_sky.skd or code_rot.skd)"
+          "'plan' list GMST preserving start times for all dates between '--time' and '--end';" \
+          "'inspect' summarize .skd file(s) based on their header (no '--time' required);" \
+          "'index' index all .skd files of an archive directory (no '--time' required);" \
+          "'query' list archived .skd files that fit '--time' best based on the index;" \
+          "'trim' extract all scans between '--time' and '--end' (code_trim.skd);" \
+          "new .skd file is stored in same folder as passed .skd file (code_gmst.skd, code_sky.skd or code_rot.skd);" \
+          "if a directory is passed, all .skd files in it are processed incrementally (up-to-date outputs are skipped)"
 
     parser = ArgumentParser(description=doc)
-    parser.add_argument("-s", "--skd", required=True, help="path to .skd file")
-    parser.add_argument("-t", "--time", required=True, help="target start time (format = 'yyyy-mm-dd' or "
-                                                            "'yyyy-mm-ddThh:mm:ss' - all times are UTC")
-    parser.add_argument("-a", "--approach", required=True, choices=["gmst", "sky", "rotate"],
+    parser.add_argument("-s", "--skd", required=True, help="path to .skd file or directory with .skd files")
+    parser.add_argument("-t", "--time", action="append",
+                        help="target start time (format = 'yyyy-mm-dd' or 'yyyy-mm-ddThh:mm:ss' - all times are UTC); "
+                             "can be passed multiple times to sweep a .skd file over many targets in parallel "
+                             "processes (code_gmst_yyyymmddhhmmss.skd, ...)")
+    parser.add_argument("-a", "--approach", required=True,
+                        choices=["gmst", "sky", "rotate", "plan", "inspect", "index", "query", "trim"],
                         help="chose an approach to use for changing the schedule. In case of 'gmst' only the date "
-                             "date information is taken from '--time'; 'rotate' only works for 24-hour schedules")
+                             "date information is taken from '--time'; 'rotate' only works for schedules of at least "
+                             "one sidereal day; 'plan' uses '--time' as first date")
+    parser.add_argument("-e", "--end", help="last date for approach 'plan' (format = 'yyyy-mm-dd') or window end for "
+                                            "approach 'trim' (format = 'yyyy-mm-ddThh:mm:ss')")
+    parser.add_argument("-w", "--window", action="append",
+                        help="allowed UTC window for approach 'plan' (format = 'hh:mm-hh:mm'), can be passed "
+                             "multiple times (default = whole day)")
+    parser.add_argument("--write", action="store_true",
+                        help="write new .skd file for each date found by approach 'plan' (default = False)")
+    parser.add_argument("--format", choices=["json", "csv"], default="json",
+                        help="output format of approach 'inspect' (default = json)")
+    parser.add_argument("--rank", choices=["gmst", "rotate"], default="gmst",
+                        help="rank candidates of approach 'query' by start shift for 'gmst' or by GMST offset of "
+                             "closest scan for 'rotate' (default = gmst)")
+    parser.add_argument("-n", "--number", type=int, default=5,
+                        help="number of candidates listed by approach 'query' (default = 5)")
+    parser.add_argument("-c", "--compression", choices=["gz", "xz", "zst"], default=None,
+                        help="compress new .skd file (default = None). Compressed input files are detected "
+                             "automatically")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="process all .skd files of a directory, even if outputs are up to date (default = False)")
+    parser.add_argument("--watch", type=float, nargs="?", const=10, default=None, metavar="SECONDS",
+                        help="poll the directory and process new .skd files as they arrive (default interval = 10)")
+    parser.add_argument("--iers_file", default=None,
+                        help="local IERS-A (finals2000A) or IERS-B (eopc04) file used for UT1-UTC (default = None)")
+    parser.add_argument("--offline", action="store_true",
+                        help="never download IERS tables, use '--iers_file' or the IERS-A file shipped with astropy "
+                             "(default = False)")
+    parser.add_argument("--iers_range", choices=["error", "warn", "ignore"], default=None,
+                        help="policy for times outside the IERS table: raise an error, warn or silently continue with "
+                             "degraded accuracy (default = astropy's policy, usually error)")
+    parser.add_argument("--archive", default=None,
+                        help="stream all new .skd files of approaches 'gmst', 'sky' and 'rotate' into one archive "
+                             "(.tar, .tar.gz, .tar.xz or .zip) including an index file (default = None)")
     parser.add_argument("-l", "--log_file", default=False, help="save log to file (default = False)")
     args = parser.parse_args()
     initialize_logging("Info", args.log_file)
+    if args.offline or args.iers_file or args.iers_range is not None:
+        configure_iers(args.iers_file, not args.offline, args.iers_range)
 
-    if len(args.time) == 19:
-        start = datetime.datetime.strptime(args.time, "%Y-%m-%dT%H:%M:%S")
-    elif len(args.time) == 10:
-        start = datetime.datetime.strptime(args.time, "%Y-%m-%d")
-    else:
+    if args.approach.lower() == "inspect":
+        skd_path = Path(args.skd)
+        summaries = inspect_directory(skd_path) if skd_path.is_dir() else [inspect_skd(skd_path)]
+        write_summaries(summaries, args.format, sys.stdout)
+        sys.exit()
+    if args.approach.lower() == "index":
+        build_index(Path(args.skd))
+        sys.exit()
+
+    if args.time is None:
+        logger.critical(f"approach '{args.approach}' requires '--time'")
+        sys.exit()
+    starts = [parse_time(time) for time in args.time]
+    if None in starts:
         logger.critical("unknown datetime format - use 'yyyy-mm-ddThh:mm:ss' or 'yyyy-mm-dd'")
         sys.exit()
+    start = starts[0]
 
     skd_path = Path(args.skd)
-    if args.approach.lower() == "gmst":
-        update_based_on_gmst(skd_path, start.date())
+    if args.watch is not None and not skd_path.is_dir():
+        logger.critical("'--watch' requires a directory passed via '--skd'")
+        sys.exit()
+    is_sweep = (len(starts) > 1 or args.archive) and args.approach.lower() in ["gmst", "sky", "rotate"]
+    if is_sweep and skd_path.is_dir():
+        logger.critical("multiple '--time' values and '--archive' require a .skd file passed via '--skd'")
+        sys.exit()
+    if is_sweep:
+        sweep(skd_path, args.approach, starts, args.compression, archive=args.archive)
+    elif skd_path.is_dir() and args.approach.lower() in ["gmst", "sky", "rotate"]:
+        if args.watch is not None:
+            watch_directory(skd_path, args.approach, start, args.compression, args.watch)
+        else:
+            process_directory(skd_path, args.approach, start, args.compression, args.force)
+    elif args.approach.lower() == "gmst":
+        update_based_on_gmst(skd_path, start.date(), args.compression)
     elif args.approach.lower() == "sky":
-        rotate_sky(skd_path, start)
+        rotate_sky(skd_path, start, args.compression)
     elif args.approach.lower() == "rotate":
-        rotate_schedule(skd_path, start)
+        rotate_schedule(skd_path, start, args.compression)
+    elif args.approach.lower() == "plan":
+        if args.end is None:
+            logger.critical("approach 'plan' requires '--end'")
+            sys.exit()
+        end = datetime.datetime.strptime(args.end, "%Y-%m-%d").date()
+        windows = [parse_window(w) for w in args.window] if args.window else None
+        plan = plan_gmst_start_times(skd_path, start.date(), end, windows, args.write, args.compression)
+        print(f"{'date':10s}  {'start':8s}  {'offset [s]':>10s}  output")
+        for entry in plan:
+            print(f"{entry['date']}  {entry['start'].time()}  {entry['offset']:10.4f}  {entry['output'] or ''}")
+    elif args.approach.lower() == "query":
+        candidates = query_index(skd_path, start, args.rank, args.number)
+        print(f"{'score [h]':>9s}  {'hours':>5s}  {'start':19s}  file")
+        for c in candidates:
+            print(f"{c['score']:9.4f}  {c['hours']:5.1f}  {c['start']:19s}  {c['file']}")
+    elif args.approach.lower() == "trim":
+        end = parse_time(args.end) if args.end else None
+        if end is None:
+            logger.critical("approach 'trim' requires '--end' (format = 'yyyy-mm-ddThh:mm:ss')")
+            sys.exit()
+        trim_schedule(skd_path, start, end, compression=args.compression)
     else:
         logger.critical("approach not supported")
@@ -0,0 +1,164 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+import datetime
+from pathlib import Path
+
+import numpy as np
+from astropy import units as u
+from astropy.time import Time
+
+from util import logger, open_skd, read_skd, write_skd, output_path, find_start_time, update_times, SIDEREAL_RATE
+
+
+def plan_gmst_start_times(path_skd, first_date, last_date, windows=None, write=False, compression=None):
+    """
+    list all dates between first_date and last_date that allow a GMST preserving session start within the
+    allowed UTC windows
+
+    optionally, a new .skd file is stored for each matching date in same folder as the input .skd file with
+    "_gmst_yyyymmddhhmmss" suffix (code_gmst_20210622180512.skd)
+
+    :param path_skd: path to skd file that should be planned
+    :param first_date: first date to check
+    :param last_date: last date to check (inclusive)
+    :param windows: list of allowed UTC windows as (start, end) tuples of datetime.time (default = whole day)
+    :param write: write new .skd file for each matching date (default = False)
+    :param compression: compress new .skd files ['gz', 'xz', 'zst'] (default = None)
+    :return: list of dictionaries with keys "date", "start", "offset" (GMST offset in seconds of hour angle) and "output"
+    """
+    logger.info(f"planning GMST preserving start times between {first_date} and {last_date}")
+    skd = Path(path_skd)
+    if not skd.is_file():
+        logger.critical(f'The following skd file {skd.absolute()} was not found')
+        raise FileNotFoundError(f'The following skd file {skd.absolute()} was not found')
+
+    # get original session start time and GMST (only the header of the original .skd is read)
+    with open_skd(path_skd) as f:
+        original_start_time = find_start_time(f)
+    apy_time = Time(original_start_time, scale='utc')
+    sidereal_start_time = apy_time.sidereal_time('mean', 'greenwich')
+    logger.info(f"session start time in skd file {original_start_time} (GMST {sidereal_start_time:.4f})")
+
+    n_days = (last_date - first_date).days + 1
+    dates = [first_date + datetime.timedelta(days=d) for d in range(n_days)]
+    start_times, offsets = find_times_equal_gmst(dates, sidereal_start_time)
+
+    # original .skd is read once for all new .skd files
+    skd = read_skd(path_skd) if write else None
+    plan = []
+    for start_time, offset in zip(start_times, offsets):
+        if not in_windows(start_time.time(), windows):
+            continue
+        entry = {"date": start_time.date(), "start": start_time, "offset": offset, "output": None}
+
+        if write:
+            out = output_path(path_skd, f"_gmst_{start_time.strftime('%Y%m%d%H%M%S')}", compression)
+            write_skd(out, update_times(skd, start_time, original_start_time=original_start_time), compression)
+            entry["output"] = out
+
+        plan.append(entry)
+
+    logger.info(f"{len(plan)} of {len(start_times)} possible start times are within the allowed windows")
+    return plan
+
+
+def find_times_equal_gmst(dates, target_gmst):
+    """
+    find all times within the given dates that have the required target_gmst
+
+    all dates are computed at once: a first guess is derived from the GMST at midnight and the sidereal rate,
+    followed by a single correction step. Since a sidereal day is shorter than a solar day, some dates have
+    two matching times. Times are rounded to full seconds.
+
+    :param dates: list of dates for which times with equal GMST should be found
+    :param target_gmst: target GMST
+    :return: sorted list of matching times and numpy array of corresponding GMST offsets in seconds of hour angle
+    """
+    midnight = [datetime.datetime.combine(d, datetime.datetime.min.time()) for d in dates]
+    if not midnight:
+        return [], np.array([])
+    target = target_gmst.to_value('hourangle')
+
+    # first guess based on GMST at midnight
+    apy_midnight = Time(midnight, scale='utc')
+    gmst_midnight = apy_midnight.sidereal_time('mean', 'greenwich').to_value('hourangle')
+    dt = ((target - gmst_midnight) % 24) / SIDEREAL_RATE
+
+    # second match on same date one sidereal day later
+    dt = np.concatenate([dt, dt + 24 / SIDEREAL_RATE])
+    days = np.concatenate([np.arange(len(midnight))] * 2)
+    valid = dt < 24
+    dt, days = dt[valid], days[valid]
+
+    # round to full seconds and evaluate remaining offset
+    seconds = np.round(dt * 3600)
+    apy_candidates = apy_midnight[days] + seconds * u.s
+    gmst = apy_candidates.sidereal_time('mean', 'greenwich').to_value('hourangle')
+    delta = (gmst - target + 12) % 24 - 12
+    correction = np.round(delta * 3600 / SIDEREAL_RATE)
+    seconds -= correction
+    offsets = np.abs(delta - correction * SIDEREAL_RATE / 3600) * 3600
+
+    # reject candidates pushed out of their date by the correction step
+    valid = (seconds >= 0) & (seconds < 86400)
+    seconds, days, offsets = seconds[valid], days[valid], offsets[valid]
+
+    order = np.lexsort((seconds, days))
+    times = [midnight[days[i]] + datetime.timedelta(seconds=int(seconds[i])) for i in order]
+    return times, offsets[order]
+
+
+def in_windows(time, windows):
+    """
+    check if time of day is within one of the allowed windows
+
+    windows are half open [start, end), windows with end before start wrap around midnight
+
+    :param time: time of day
+    :param windows: list of (start, end) tuples of datetime.time (None means whole day)
+    :return: True if time is within any window
+    """
+    if not windows:
+        return True
+    for start, end in windows:
+        if start <= end:
+            if start <= time < end:
+                return True
+        elif time >= start or time < end:
+            return True
+    return False
+
+
+def parse_window(window):
+    """
+    parse UTC window string
+
+    :param window: window in format 'hh:mm-hh:mm'
+    :return: (start, end) tuple of datetime.time
+    """
+    start, end = window.split("-")
+    return (datetime.datetime.strptime(start.strip(), "%H:%M").time(),
+            datetime.datetime.strptime(end.strip(), "%H:%M").time())
+
+
+if __name__ == "__main__":
+    from util import initialize_logging
+
+    initialize_logging()
+    for e in plan_gmst_start_times(Path('test/vt1176.skd'), datetime.date(2021, 1, 1), datetime.date(2021, 12, 31),
+                                   [parse_window("17:00-19:00")]):
+        print(e["date"], e["start"].time(), f"{e['offset']:.4f}")
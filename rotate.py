@@ -17,22 +17,35 @@
 import datetime
 from pathlib import Path
 
+import numpy as np
+from astropy import units as u
 from astropy.time import Time
 
-from util import logger, find_start_time, find_end_time, update_skd_times, REGEX_SKED
+from util import logger, iter_skd, write_skd, output_path, read_header, find_start_time, find_end_time, \
+    update_skd_times, replace_time, REGEX_START, REGEX_END, REGEX_SKED, SIDEREAL_RATE, SIDEREAL_DAY
+
+# sessions may be this much shorter (in seconds) than whole sidereal days
+PERIOD_TOLERANCE = 900
+
+# warn if GMST offset (in seconds) between first scan and new start time is larger
+MAX_OFFSET = 300
 
 
 class SessionTooShortException(Exception):
     pass
 
 
-def rotate_schedule(path_skd, target_start):
+def rotate_schedule(path_skd, target_start, compression=None):
     """
     rotate order of scans to match GSMT of new start time
     new .skd file will be stored in same folder as the input .skd file with "_rot" suffix (code_rot.skd)
+    input and output .skd files can be compressed (gzip, xz or zstd)
+
+    the original .skd file is streamed to the new .skd file, only the $SKED block is kept in memory
 
     :param path_skd: path to skd file that should be manipulated
     :param target_start: new session start day and time
+    :param compression: compress new .skd file ['gz', 'xz', 'zst'] (default = None)
     :return:
     """
     logger.info(f"rotating schedule to match new start time {target_start}")
@@ -41,148 +54,259 @@ def rotate_schedule(path_skd, target_start):
         logger.critical(f'The following skd file {skd.absolute()} was not found')
         raise FileNotFoundError(f'The following skd file {skd.absolute()} was not found')
 
-    # read original .skd
-    skd = []
-    with open(path_skd) as f:
-        skd = f.readlines()
+    # first pass: read session start, session end and scans
+    _, original_start_time, original_end_time = read_header(path_skd)
+    scan_times, durations = find_scans(iter_skd(path_skd))
+    rotation = plan_rotation(original_start_time, original_end_time, scan_times, durations, target_start)
+
+    # second pass: stream original .skd to new .skd file
+    out = output_path(path_skd, "_rot", compression)
+    logger.info(f"output new .skd file to {out.absolute()}")
+    write_skd(out, rotate_lines(iter_skd(path_skd), target_start, *rotation), compression)
+
+
+def rotate_schedule_skd(skd, target_start):
+    """
+    rotate order of scans of skd file to match GMST of new start time
 
-    # get GMST of original start and new start time
-    original_start_time = find_start_time(skd)
-    original_end_time = find_end_time(skd)
+    sessions of at least one sidereal day are supported, scans before the rotation point are moved by whole sidereal
+    days (see find_wrap_point)
 
+    :param skd: skd file
+    :param target_start: new session start day and time
+    :return: updated copy of skd file (the passed skd file is not changed)
+    """
+    scan_times, durations = find_scans(skd)
+    rotation = plan_rotation(find_start_time(skd), find_end_time(skd), scan_times, durations, target_start)
+    return list(rotate_lines(skd, target_start, *rotation))
+
+
+def plan_rotation(original_start_time, original_end_time, scan_times, durations, target_start):
+    """
+    find rotation point and new session end (see find_wrap_point)
+
+    :param original_start_time: original session start time
+    :param original_end_time: original session end time
+    :param scan_times: list of scan start times
+    :param durations: list of scan durations in seconds
+    :param target_start: new session start day and time
+    :return: original time of new first scan, period in seconds, original time of first removed scan (or None),
+             new session end time
+    """
     hours = (original_end_time - original_start_time).total_seconds() / 3600
-    if hours != 24:
-        logger.critical(f'rotating schedule only works for 24-hour sessions')
+    if not scan_times:
+        logger.critical('schedule has no scans to rotate')
         raise SessionTooShortException()
 
-    apy_time_start = Time(target_start, scale='utc')
-    sidereal_new_start_time = apy_time_start.sidereal_time('mean', 'greenwich')
+    # get GMST of all scans and new start time
+    seconds = np.array([(t - original_start_time).total_seconds() for t in scan_times])
+    scan_gmst = (Time(original_start_time, scale='utc') + seconds * u.s).sidereal_time('mean', 'greenwich')
+    sidereal_new_start_time = Time(target_start, scale='utc').sidereal_time('mean', 'greenwich')
     logger.info(f"new start time start at  GMST {sidereal_new_start_time:.6f}")
 
-    original_start_scan_time = find_best_scan_to_start(sidereal_new_start_time, skd)
-    logger.info(f"new schedule starts with scan {original_start_scan_time}")
-    rotate_sked(skd, target_start, original_start_scan_time)
+    first, keep, period = find_wrap_point(seconds, np.array(durations), scan_gmst.to_value('hourangle'),
+                                          sidereal_new_start_time.to_value('hourangle'), hours)
+    logger.info(f"new schedule starts with scan {scan_times[first]}")
+    drop = scan_times[keep] if keep < len(scan_times) else None
+
+    # extend session if second block ends after original session length
+    new_end_time = target_start + (original_end_time - original_start_time)
+    if first > 0:
+        end_of_2nd_block = target_start + (scan_times[first - 1] - scan_times[first]) + \
+            datetime.timedelta(seconds=period + durations[first - 1])
+        if end_of_2nd_block > new_end_time:
+            logger.info(f"session end is extended to {end_of_2nd_block}")
+            new_end_time = end_of_2nd_block
+        elif drop is not None:
+            # second block is the end of the new schedule, scans after it were removed
+            logger.warning(f"session end is moved back to {end_of_2nd_block} (end of last scan)")
+            new_end_time = end_of_2nd_block
+    return scan_times[first], period, drop, new_end_time
+
+
+def find_scans(skd):
+    """
+    start times and durations of all scans in $SKED block
 
-    # write new .skd file
-    out = path_skd.parent / f"{path_skd.stem}_rot.skd"
-    logger.info(f"output new .skd file to {out.absolute()}")
-    with open(out, 'w') as f:
-        f.write("".join(skd))
+    :param skd: skd file
+    :return: list of scan start times, list of scan durations in seconds
+    """
+    scan_times = []
+    durations = []
+    sked_block = False
+    for l in skd:
+        if l.strip().startswith("$"):
+            sked_block = l.startswith("$SKED")
 
+        if sked_block and REGEX_SKED.search(l):
+            match = REGEX_SKED.search(l)
+            scan_times.append(datetime.datetime.strptime(match.group(1), '%y%j%H%M%S'))
+            durations.append(float(l.split()[5]))
+    return scan_times, durations
 
-def rotate_sked(skd, target_start, original_start_scan_time):
+
+def find_wrap_point(seconds, durations, scan_gmst, target_gmst, hours):
     """
-    rotate sked block to match GMST
+    find rotation point of schedule
+
+    the schedule is treated as periodic with a period of whole sidereal days covered by the session (sessions may
+    be up to PERIOD_TOLERANCE shorter). Sessions shorter than one sidereal day cannot be rotated without losing their
+    GMST. Scans from the rotation point onwards are moved to the new start time, scans before it are appended one
+    period later, thus, every scan keeps its GMST and the wrap (where original session end meets original start) is
+    placed at a sidereal-day boundary. Scans that end more than one period after the first scan would overlap the
+    wrap and are removed if the schedule is rotated (they repeat the sky of the session start).
+
+    all candidate splits are scored at once. The score is the GMST offset between scan and new start time (in
+    seconds) plus the idle time the wrap adds to the schedule (gap at the wrap minus the gap before the candidate
+    scan, which is moved to the session end)
+
+    :param seconds: scan start times in seconds since session start (sorted)
+    :param durations: scan durations in seconds
+    :param scan_gmst: GMST of scan starts in hours
+    :param target_gmst: GMST of new start time in hours
+    :param hours: session length in hours
+    :return: index of first scan, number of scans kept in first block, period in seconds
+    """
+    days = int((hours * 3600 + PERIOD_TOLERANCE) // SIDEREAL_DAY)
+    if days == 0:
+        logger.critical('rotating schedule only works for sessions of at least one sidereal day')
+        raise SessionTooShortException()
+    period = int(round(days * SIDEREAL_DAY))
+    ends = seconds + durations
+
+    # scans that fit into one period after the first scan
+    overlap = np.flatnonzero(ends - seconds[0] > period)
+    keep = int(np.searchsorted(seconds, seconds[overlap[0]])) if len(overlap) else len(seconds)
+    if keep == 0:
+        keep = len(seconds)
+
+    offset = np.abs((scan_gmst[:keep] - target_gmst + 12) % 24 - 12) * 3600 / SIDEREAL_RATE
+    wrap = seconds[0] + period - ends[keep - 1]
+    gap = np.empty(keep)
+    gap[0] = wrap
+    gap[1:] = seconds[1:keep] - ends[:keep - 1]
+    score = offset + wrap - gap
+    # do not split simultaneous scans
+    score[1:][seconds[1:keep] == seconds[:keep - 1]] = np.inf
+
+    first = int(np.argmin(score))
+    logger.info(f"scan {first} is best rotation point (GMST offset = {offset[first]:.2f} sec, "
+                f"additional gap at wrap = {wrap - gap[first]:.0f} sec)")
+    if offset[first] > MAX_OFFSET:
+        logger.warning(f"GMST offset of first scan is {offset[first]:.0f} sec, azimuth and elevation of scans are not "
+                       f"preserved")
+    if first == 0:
+        keep = len(seconds)
+    elif keep < len(seconds):
+        logger.warning(f"{len(seconds) - keep} scans at session end ({(ends[-1] - seconds[keep]) / 3600:.2f} hours) "
+                       f"overlap the wrap and are removed")
+    return first, keep, period
+
+
+def rotate_lines(lines, target_start, original_start_scan_time, period, original_drop_scan_time=None, new_end_time=None):
+    """
+    rotate sked block to match GMST line by line
 
-    :param skd: original skd file
+    all lines except the $SKED block are passed through directly, the $SKED block is buffered and rotated once it
+    is complete (see rotate_sked)
+
+    :param lines: iterable of lines
     :param target_start: new start time
     :param original_start_scan_time: original start time
-    :return:
+    :param period: time shift of scans before original start time in seconds (whole sidereal days, see
+                   find_wrap_point)
+    :param original_drop_scan_time: remove scans from this original scan time until session end (default = None)
+    :param new_end_time: new session end time (default = None, same session length)
+    :return: generator of updated lines
     """
-    start_idx = None
-    end_idx = len(skd)
-
-    # split sked block in two parts, one before new start scan and one after new start scan
-    sked_block = False
-    for idx, l in enumerate(skd):
+    original_start_time = None
+    start_changed = False
+    end_changed = False
+    sked_block = None
+    for l in lines:
         if l.strip().startswith("$"):
+            if sked_block is not None:
+                yield from rotate_sked(sked_block, target_start, original_start_scan_time, period,
+                                       original_drop_scan_time)
+                sked_block = None
             if l.startswith("$SKED"):
-                sked_block = True
-                start_idx = idx + 1
-            else:
-                if sked_block:
-                    end_idx = idx
-                    break
-    sked_block = skd[start_idx:end_idx]
+                sked_block = []
+                yield l
+                continue
+        if sked_block is not None:
+            sked_block.append(l)
+            continue
+
+        if not start_changed and REGEX_START.search(l):
+            original_start_time = datetime.datetime.strptime(REGEX_START.search(l).group(1), '%y%j%H%M%S')
+            l = replace_time(REGEX_START, l, target_start)
+            start_changed = True
+        if not end_changed and REGEX_END.search(l):
+            if new_end_time is None:
+                original_end_time = datetime.datetime.strptime(REGEX_END.search(l).group(1), '%y%j%H%M%S')
+                new_end_time = target_start + (original_end_time - original_start_time)
+            l = replace_time(REGEX_END, l, new_end_time)
+            end_changed = True
+        yield l
+
+    if sked_block is not None:
+        yield from rotate_sked(sked_block, target_start, original_start_scan_time, period, original_drop_scan_time)
+
+
+def rotate_sked(sked_block, target_start, original_start_scan_time, period, original_drop_scan_time=None):
+    """
+    rotate sked block to match GMST
 
+    :param sked_block: lines of original $SKED block
+    :param target_start: new start time
+    :param original_start_scan_time: original start time
+    :param period: time shift of scans before original start time in seconds (whole sidereal days, see
+                   find_wrap_point)
+    :param original_drop_scan_time: remove scans from this original scan time until session end (default = None)
+    :return: lines of new $SKED block
+    """
     # this is sked block of scans from new start scan until session end
-
-    # define dummy start time to be able to call update_skd_times
     new_sked_1 = []
     # this is sked block of scans from session start until new start scan
     new_sked_2 = []
     logger.info("splitting original $SKED block into two parts")
     for idx, l in enumerate(sked_block):
-        if sked_block and REGEX_SKED.search(l):
+        if REGEX_SKED.search(l):
             match = REGEX_SKED.search(l)
             tmp_time = datetime.datetime.strptime(match.group(1), '%y%j%H%M%S')
-            if tmp_time == original_start_scan_time:
+            if tmp_time == original_start_scan_time and not new_sked_1:
                 new_sked_1 = sked_block[idx:]
                 new_sked_2 = sked_block[:idx]
-                logger.info(f"first block is from {tmp_time} until session end ({len(new_sked_1)} scans)")
-                logger.info(f"second block is from session start until {tmp_time} ({len(new_sked_2)} scans)")
+            elif tmp_time == original_drop_scan_time and new_sked_1:
+                new_sked_1 = new_sked_1[:len(new_sked_1) - (len(sked_block) - idx)]
                 break
+    logger.info(f"first block is from {original_start_scan_time} until session end ({len(new_sked_1)} scans)")
+    logger.info(f"second block is from session start until {original_start_scan_time} ({len(new_sked_2)} scans)")
 
     if new_sked_1:
         # define dummy start time and $sked block to be able to call update_skd_times for first sked block
         new_sked_1 = [f"START {original_start_scan_time.strftime('%y%j%H%M%S')}", "$SKED"] + new_sked_1
-        update_skd_times(new_sked_1, target_start)
+        new_sked_1 = update_skd_times(new_sked_1, target_start)
         logger.info(f"first block is now put to {target_start} onwards")
         new_sked_1 = new_sked_1[2:]
 
     # do the same for 2nd sked block
-    # here, you have to align the schedule to the new end time
+    # here, scans are moved by one period to keep their GMST
     if new_sked_2:
         original_first_scan_time = None
-        new_last_scan_original_end_time = None
         for l in new_sked_2:
-            if sked_block and REGEX_SKED.search(l):
+            if REGEX_SKED.search(l):
                 match = REGEX_SKED.search(l)
                 original_first_scan_time = datetime.datetime.strptime(match.group(1), '%y%j%H%M%S')
                 break
-        for l in new_sked_2[::-1]:
-            if sked_block and REGEX_SKED.search(l):
-                match = REGEX_SKED.search(l)
-                new_last_scan_original_start_time = datetime.datetime.strptime(match.group(1), '%y%j%H%M%S')
-                tmp = l.split()
-                dur = float(tmp[5])
-                new_last_scan_original_end_time = new_last_scan_original_start_time + datetime.timedelta(seconds=dur)
-                break
-        delta_time = (new_last_scan_original_end_time - original_first_scan_time).total_seconds()
         new_sked_2 = [f"START {original_first_scan_time.strftime('%y%j%H%M%S')}", "$SKED"] + new_sked_2
-        start_of_2nd_block = target_start + datetime.timedelta(1) - datetime.timedelta(seconds=delta_time)
+        start_of_2nd_block = target_start + (original_first_scan_time - original_start_scan_time) + \
+            datetime.timedelta(seconds=period)
         logger.info(f"second block is now put to {start_of_2nd_block} onwards")
-        logger.info(f"check if there is enough slew time between first and second block")
-        update_skd_times(new_sked_2, start_of_2nd_block)
+        new_sked_2 = update_skd_times(new_sked_2, start_of_2nd_block)
         new_sked_2 = new_sked_2[2:]
 
-    new_sked_block = new_sked_1 + new_sked_2
-    skd[start_idx:end_idx] = new_sked_block
-
-    update_skd_times(skd, target_start, sked=False)
-    pass
-
-
-def find_best_scan_to_start(target_sidereal_time, skd):
-    """
-    find a scan in original skd file that matches sidereal time best
-
-    :param target_sidereal_time: target sidereal time
-    :param skd: sked file
-    :return:
-    """
-    offset = float('inf')
-    new_start = None
-    sked_block = False
-    for l in skd:
-        if l.strip().startswith("$"):
-            if l.startswith("$SKED"):
-                sked_block = True
-            else:
-                sked_block = False
-
-        if sked_block and REGEX_SKED.search(l):
-            match = REGEX_SKED.search(l)
-            tmp_time = datetime.datetime.strptime(match.group(1), '%y%j%H%M%S')
-            apy_time = Time(tmp_time, scale='utc')
-            tmp_sidereal_time = apy_time.sidereal_time('mean', 'greenwich')
-
-            delta = abs((tmp_sidereal_time - target_sidereal_time).value)
-            if delta < offset:
-                offset = delta
-                new_start = tmp_time
-    logger.info(f"scan at {new_start} matches new start GMST best (offset = {offset * 3600:.2f} sec)")
-    return new_start
+    return new_sked_1 + new_sked_2
 
 
 if __name__ == "__main__":
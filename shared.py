@@ -0,0 +1,540 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+import datetime
+import io
+import json
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+from astropy import units as u
+from astropy.coordinates import Angle
+from astropy.time import Time
+
+from gmst import find_time_equal_gmst
+from rotate import SessionTooShortException, find_wrap_point
+from sky import REGEX_SOURCE
+from util import logger, read_skd, open_skd, output_path, configure_iers, IERS_SETTINGS, REGEX_START, REGEX_END, REGEX_SKED
+
+# output file suffix per approach
+SUFFIXES = {"gmst": "_gmst", "sky": "_sky", "rotate": "_rot"}
+
+# schedule attached by sweep workers
+_schedule = None
+
+
+class SharedSchedule:
+    """
+    parsed .skd file stored in shared memory
+
+    the schedule is parsed once, afterwards, other processes can attach to it without copying. It consists of the
+    following arrays:
+
+    * data: raw bytes of the .skd file
+    * lines: byte offset of each line start (plus end of file)
+    * param: START and END entries (line index, byte column of time, seconds since session start)
+    * scans: scans of $SKED block (line index, byte column of time, seconds since session start, duration)
+    * scan_gmst: GMST of each scan start in hours
+    * sources: sources of $SOURCES block (line index, byte spans of RA hour, minute and second)
+    * ra: right ascension of each source in hours
+    """
+
+    ARRAYS = ["data", "lines", "param", "scans", "scan_gmst", "sources", "ra"]
+
+    def __init__(self, arrays, info, memory=None):
+        self.arrays = arrays
+        self.info = info
+        self._memory = memory or {}
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def create(cls, skd):
+        """
+        parse skd file and store it in shared memory
+
+        :param skd: skd file
+        :return: SharedSchedule (call close() and unlink() once it is no longer needed)
+        """
+        arrays, info = parse_schedule(skd)
+        memory = {}
+        shared = {}
+        for name, array in arrays.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+            shared[name][...] = array
+            memory[name] = shm
+        return cls(shared, info, memory)
+
+    @property
+    def descriptor(self):
+        """
+        picklable description that is used to attach to the shared memory
+
+        :return: dictionary
+        """
+        return {"info": self.info,
+                "arrays": {name: (self._memory[name].name, array.shape, array.dtype.str)
+                           for name, array in self.arrays.items()}}
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+        attach to shared memory created by another process
+
+        :param descriptor: descriptor of SharedSchedule
+        :return: SharedSchedule
+        """
+        memory = {}
+        arrays = {}
+        for name, (shm_name, shape, dtype) in descriptor["arrays"].items():
+            shm = shared_memory.SharedMemory(name=shm_name)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+            memory[name] = shm
+        return cls(arrays, descriptor["info"], memory)
+
+    def close(self):
+        """
+        close access to shared memory
+
+        :return: None
+        """
+        self.arrays = {}
+        for name in self.ARRAYS:
+            setattr(self, name, None)
+        for shm in self._memory.values():
+            shm.close()
+
+    def unlink(self):
+        """
+        free shared memory (only call once, from the process that created it)
+
+        :return: None
+        """
+        for shm in self._memory.values():
+            shm.unlink()
+        self._memory = {}
+
+    def write(self, f, approach, target):
+        """
+        write new .skd file for target start time
+
+        the result is equal to update_skd_based_on_gmst, rotate_sky_skd or rotate_schedule_skd
+
+        :param f: binary file object
+        :param approach: approach to use ['gmst', 'sky', 'rotate']
+        :param target: target start time (in case of 'gmst' only the date is used)
+        :return: new session start time
+        """
+        gmst = self.info["gmst"]
+
+        # replaced lines ($PARAM and $SOURCES), $SKED lines are generated while writing
+        replace = {}
+        # (first scan, last scan + 1, new start time of first scan) of each scan block
+        blocks = None
+        # ranges of lines to write
+        segments = [(0, len(self.lines) - 1)]
+        # seconds since session start of START and END
+        param = self.param[:, 2].copy()
+        if approach == "gmst":
+            if isinstance(target, datetime.datetime):
+                target = target.date()
+            target = find_time_equal_gmst(target, Angle(gmst, unit='hourangle'))
+            blocks = [(0, len(self.scans), target)]
+        elif approach == "sky":
+            diff = Time(target, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle') - gmst
+            logger.info(f"GMST difference is {diff} hours")
+            self._rotate_sources(replace, diff)
+            blocks = [(0, len(self.scans), target)]
+        elif approach == "rotate":
+            if not len(self.scans):
+                logger.critical('schedule has no scans to rotate')
+                raise SessionTooShortException()
+            blocks, segments, length = self._rotate_sked(target)
+            if blocks[0][1] < len(self.scans):
+                # scans at session end were removed, session ends with second block
+                param[1:] = length
+            else:
+                # session end is extended if second block ends after original session length
+                param[1:] = np.maximum(param[1:], length)
+        else:
+            raise ValueError(f"approach '{approach}' not supported")
+
+        for (idx, col, _), seconds in zip(self.param, param):
+            line = replace.get(int(idx), None) or self._line(int(idx))
+            replace[int(idx)] = self._shift_time(line, int(col), target, int(seconds))
+
+        self._write_lines(f, replace, blocks, segments)
+        return target
+
+    def _line(self, idx):
+        return bytes(self.data[self.lines[idx]:self.lines[idx + 1]])
+
+    @staticmethod
+    def _shift_time(line, col, new_start, seconds):
+        """
+        replace 11 digit time at byte column col of line with new_start + seconds
+        """
+        new_time = new_start + datetime.timedelta(seconds=seconds)
+        return line[:col] + new_time.strftime('%y%j%H%M%S').encode() + line[col + 11:]
+
+    def _rotate_sources(self, replace, diff):
+        """
+        rotate right ascension of sources (same formatting as sky.rotate_sources)
+        """
+        for row, orig_hms in zip(self.sources, self.ra):
+            idx, h0, h1, m0, m1, s0, s1 = (int(v) for v in row)
+            line = self._line(idx)
+            target_hms = (orig_hms + diff) % 24
+            target_hour_str = f"{int(target_hms):02d}"
+            target_minute_str = f"{int(target_hms * 60 % 60):02d}"
+            target_second_str = f"{target_hms * 3600 % 60:.5f}"
+            replace[idx] = line[:h0] + target_hour_str.encode() + line[h1:m0] + target_minute_str.encode() + \
+                line[m1:s0] + target_second_str.encode() + line[s1:]
+
+    def _rotate_sked(self, target_start):
+        """
+        rotate $SKED block to match GMST of target_start (same result as rotate.rotate_sked)
+
+        :return: scan blocks, ranges of lines to write, new session length in seconds
+        """
+        target_gmst = Time(target_start, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+        seconds = self.scans[:, 2]
+        first, keep, period = find_wrap_point(seconds, self.scans[:, 3], self.scan_gmst, target_gmst,
+                                              self.info["hours"])
+
+        blocks = [(first, keep, target_start)]
+        length = 0
+        if first > 0:
+            start_of_2nd_block = target_start + datetime.timedelta(
+                seconds=int(seconds[0]) - int(seconds[first]) + period)
+            logger.info(f"second block is now put to {start_of_2nd_block} onwards")
+            blocks.append((0, first, start_of_2nd_block))
+            length = int(seconds[first - 1]) + int(self.scans[first - 1, 3]) - int(seconds[first]) + period
+
+        sked_start, sked_end = self.info["sked"]
+        split = int(self.scans[first, 0])
+        drop = int(self.scans[keep, 0]) if keep < len(self.scans) else sked_end
+        segments = [(0, sked_start), (split, drop), (sked_start, split), (sked_end, len(self.lines) - 1)]
+        return blocks, segments, length
+
+    def _write_lines(self, f, replace, blocks, segments):
+        """
+        write lines, unchanged consecutive lines are copied directly from shared memory
+        """
+        data = memoryview(self.data)
+        scan_lines = self.scans[:, 0]
+
+        # new start time and reference seconds of first scan of block for each scan
+        def _scan_start(row):
+            for first, last, new_start in blocks:
+                if first <= row < last:
+                    return new_start, int(self.scans[first, 2])
+
+        for first_line, last_line in segments:
+            run_start = first_line
+            row = int(np.searchsorted(scan_lines, first_line))
+            for idx in range(first_line, last_line):
+                if row < len(scan_lines) and scan_lines[row] == idx:
+                    new_start, reference = _scan_start(row)
+                    line = self._shift_time(self._line(idx), int(self.scans[row, 1]), new_start,
+                                            int(self.scans[row, 2]) - reference)
+                    row += 1
+                elif idx in replace:
+                    line = replace[idx]
+                else:
+                    continue
+                f.write(data[self.lines[run_start]:self.lines[idx]])
+                f.write(line)
+                run_start = idx + 1
+            f.write(data[self.lines[run_start]:self.lines[last_line]])
+
+
+def parse_schedule(skd):
+    """
+    parse skd file into arrays (see SharedSchedule)
+
+    :param skd: skd file
+    :return: dictionary of numpy arrays, dictionary of scalar information
+    """
+    encoded = [l.encode() for l in skd]
+    lines = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(l) for l in encoded], out=lines[1:])
+
+    def _col(line, char_idx):
+        return len(line[:char_idx].encode())
+
+    original_start_time = None
+    original_end_time = None
+    param = []
+    scans = []
+    sources = []
+    ra = []
+    block = None
+    sked = [None, len(skd)]
+    for idx, l in enumerate(skd):
+        if REGEX_START.search(l) and original_start_time is None:
+            match = REGEX_START.search(l)
+            original_start_time = datetime.datetime.strptime(match.group(1), '%y%j%H%M%S')
+            param.append((idx, _col(l, match.start(1)), 0))
+        if REGEX_END.search(l) and original_end_time is None:
+            match = REGEX_END.search(l)
+            original_end_time = datetime.datetime.strptime(match.group(1), '%y%j%H%M%S')
+            param.append((idx, _col(l, match.start(1)), (original_end_time - original_start_time).total_seconds()))
+
+        if l.strip().startswith("$"):
+            if block == "$SKED" and not l.startswith("$SKED"):
+                sked[1] = idx
+            block = l.split()[0]
+            if l.startswith("$SKED"):
+                sked[0] = idx + 1
+
+        if block is not None and block.startswith("$SOURCE") and REGEX_SOURCE.search(l):
+            match = REGEX_SOURCE.search(l)
+            sources.append([idx] + [_col(l, i) for i in (*match.regs[1], *match.regs[2], *match.regs[3])])
+            ra.append(float(match.group(1)) + float(match.group(2)) / 60 + float(match.group(3)) / 3600)
+
+        if block == "$SKED" and REGEX_SKED.search(l):
+            match = REGEX_SKED.search(l)
+            scan_time = datetime.datetime.strptime(match.group(1), '%y%j%H%M%S')
+            scans.append((idx, _col(l, match.start(1)), (scan_time - original_start_time).total_seconds(),
+                          float(l.split()[5])))
+
+    scans = np.array(scans, dtype=np.int64).reshape(-1, 4)
+    if len(scans):
+        scan_times = Time(original_start_time, scale='utc') + scans[:, 2] * u.s
+        scan_gmst = scan_times.sidereal_time('mean', 'greenwich').to_value('hourangle')
+    else:
+        scan_gmst = np.zeros(0)
+
+    arrays = {"data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+              "lines": lines,
+              "param": np.array(param, dtype=np.int64).reshape(-1, 3),
+              "scans": scans,
+              "scan_gmst": np.asarray(scan_gmst, dtype=np.float64),
+              "sources": np.array(sources, dtype=np.int64).reshape(-1, 7),
+              "ra": np.array(ra, dtype=np.float64),
+              }
+    gmst = Time(original_start_time, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+    info = {"start": original_start_time.strftime('%y%j%H%M%S'),
+            "hours": (original_end_time - original_start_time).total_seconds() / 3600,
+            "gmst": float(gmst),
+            "sked": (sked[0] if sked[0] is not None else len(skd), sked[1]),
+            }
+    return arrays, info
+
+
+def _attach(descriptor, iers_settings):
+    """
+    attach worker process to shared schedule
+
+    :param descriptor: descriptor of SharedSchedule
+    :param iers_settings: settings passed to configure_iers in parent process
+    :return: None
+    """
+    global _schedule
+    if iers_settings:
+        configure_iers(**iers_settings)
+    _schedule = SharedSchedule.attach(descriptor)
+
+
+def _sweep_target(approach, target, out, compression):
+    """
+    write new .skd file for one target using the attached shared schedule
+
+    :return: path to new .skd file, new session start time
+    """
+    with open_skd(out, 'wb', compression) as f:
+        new_start = _schedule.write(f, approach, target)
+    return out, new_start
+
+
+def _sweep_target_bytes(approach, target):
+    """
+    generate new .skd file for one target using the attached shared schedule
+
+    :return: content of new .skd file, new session start time
+    """
+    f = io.BytesIO()
+    new_start = _schedule.write(f, approach, target)
+    return f.getvalue(), new_start
+
+
+def sweep(path_skd, approach, targets, compression=None, max_workers=None, archive=None):
+    """
+    write new .skd files for many target start times in parallel processes
+
+    the .skd file is parsed only once and shared with all worker processes. New .skd files are stored in same
+    folder as the input .skd file with "_gmst_yyyymmddhhmmss", "_sky_yyyymmddhhmmss" or "_rot_yyyymmddhhmmss" suffix
+
+    alternatively, all new .skd files are streamed into one archive (.tar, .tar.gz, .tar.xz or .zip) together with
+    an index file (index.json) listing member name, target and new session start time of each target
+
+    :param path_skd: path to skd file that should be manipulated
+    :param approach: approach to use ['gmst', 'sky', 'rotate']
+    :param targets: list of target start times (in case of 'gmst' only the date is used)
+    :param compression: compress new .skd files ['gz', 'xz', 'zst'] (default = None, ignored for archives)
+    :param max_workers: maximum number of processes (default = ProcessPoolExecutor default)
+    :param archive: path to archive (default = None)
+    :return: list of paths to new .skd files (or archive member names) in same order as targets
+    """
+    path_skd = Path(path_skd)
+    if not path_skd.is_file():
+        logger.critical(f'The following skd file {path_skd.absolute()} was not found')
+        raise FileNotFoundError(f'The following skd file {path_skd.absolute()} was not found')
+    approach = approach.lower()
+    if approach not in SUFFIXES:
+        raise ValueError(f"approach '{approach}' not supported")
+
+    # unique suffix per target
+    suffixes = []
+    for t in targets:
+        suffix = f"{SUFFIXES[approach]}_{t.strftime('%Y%m%d%H%M%S')}"
+        n = 1
+        while suffix + (f"_{n}" if n > 1 else "") in suffixes:
+            n += 1
+        suffixes.append(suffix + (f"_{n}" if n > 1 else ""))
+
+    schedule = SharedSchedule.create(read_skd(path_skd))
+    logger.info(f"sweeping {path_skd.name} over {len(targets)} targets ({approach})")
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach,
+                                 initargs=(schedule.descriptor, dict(IERS_SETTINGS))) as executor:
+            if archive is None:
+                outs = [output_path(path_skd, suffix, compression) for suffix in suffixes]
+                futures = [executor.submit(_sweep_target, approach, t, out, compression)
+                           for t, out in zip(targets, outs)]
+                return [future.result()[0] for future in futures]
+
+            names = [output_path(path_skd, suffix).name for suffix in suffixes]
+            with SweepArchive(archive) as writer:
+                # limit number of results kept in memory
+                window = 2 * (max_workers or os.cpu_count() or 1)
+                futures = {}
+                for i, (t, name) in enumerate(zip(targets, names)):
+                    futures[i] = executor.submit(_sweep_target_bytes, approach, t)
+                    if i >= window:
+                        data, new_start = futures.pop(i - window).result()
+                        writer.add(names[i - window], data, path_skd.name, approach, targets[i - window], new_start)
+                for i in sorted(futures):
+                    data, new_start = futures[i].result()
+                    writer.add(names[i], data, path_skd.name, approach, targets[i], new_start)
+            logger.info(f"output {len(names)} new .skd files to {Path(archive).absolute()}")
+            return names
+    finally:
+        schedule.close()
+        schedule.unlink()
+
+
+class SweepArchive:
+    """
+    tar or zip archive that new .skd files are streamed into, an index (index.json) is added when it is closed
+
+    the archive is written to a temporary file which is moved to its final path only if the sweep succeeds, thus, a
+    failed sweep never leaves an archive behind that looks complete
+    """
+
+    def __init__(self, path):
+        """
+        open archive, format is based on file extension (.tar, .tar.gz, .tgz, .tar.xz or .zip)
+
+        :param path: path to archive
+        """
+        self.path = Path(path)
+        self.index = []
+        name = self.path.name
+        self._tmp = self.path.parent / f".{name}.tmp"
+        if name.endswith(".zip"):
+            self._zip = zipfile.ZipFile(self._tmp, 'w', zipfile.ZIP_DEFLATED)
+            self._tar = None
+        elif name.endswith((".tar", ".tar.gz", ".tgz", ".tar.xz")):
+            mode = "w:gz" if name.endswith((".gz", ".tgz")) else "w:xz" if name.endswith(".xz") else "w"
+            self._tar = tarfile.open(self._tmp, mode)
+            self._zip = None
+        else:
+            raise ValueError(f"unknown archive format '{name}' (use .tar, .tar.gz, .tar.xz or .zip)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _write(self, name, data):
+        if self._zip is not None:
+            self._zip.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(datetime.datetime.now().timestamp())
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def add(self, name, data, source, approach, target, new_start):
+        """
+        add new .skd file
+
+        :param name: member name
+        :param data: content of new .skd file
+        :param source: name of original .skd file
+        :param approach: approach used
+        :param target: target start time
+        :param new_start: new session start time
+        :return: None
+        """
+        self._write(name, data)
+        self.index.append({"member": name, "source": source, "approach": approach, "target": target.isoformat(),
+                           "start": new_start.isoformat(), "size": len(data)})
+
+    def close(self):
+        """
+        add index and close archive
+
+        :return: None
+        """
+        self._write("index.json", json.dumps(self.index, indent=1).encode())
+        self._close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        """
+        close and remove incomplete archive (an existing archive at path is not changed)
+
+        :return: None
+        """
+        self._close()
+        self._tmp.unlink()
+        logger.warning(f"sweep failed, archive {self.path.absolute()} was not written")
+
+    def _close(self):
+        if self._zip is not None:
+            self._zip.close()
+        else:
+            self._tar.close()
+
+
+if __name__ == "__main__":
+    from util import initialize_logging
+
+    initialize_logging()
+    sweep(Path('test/vo1189.skd'), "rotate", [datetime.datetime(2021, month, 22, 18, 0, 0) for month in range(1, 13)])
@@ -20,18 +20,20 @@ from pathlib import Path
 
 from astropy.time import Time
 
-from util import logger, find_start_time, update_skd_times
+from util import logger, open_skd, iter_skd, write_skd, output_path, find_start_time, update_skd_times, update_times
 
 REGEX_SOURCE = re.compile(r'\s*[^\s]*\s+[^\s]+\s+(\d+)\s+(\d+)\s+(\d+\.\d+)\s+[+\d-]*\s+\d+\s+\d+\.\d+')
 
 
-def rotate_sky(path_skd, target_start):
+def rotate_sky(path_skd, target_start, compression=None):
     """
     rotate source right ascension to be able to do a dry-run of sessions at arbitrary starting times
     new .skd file will be stored in same folder as the input .skd file with "_sky" suffix (code_sky.skd)
+    input and output .skd files can be compressed (gzip, xz or zstd)
 
     :param path_skd: path to skd file that should be manipulated
     :param target_start: new session start day and time
+    :param compression: compress new .skd file ['gz', 'xz', 'zst'] (default = None)
     :return:
     """
     logger.info(f"rotating sources to match new start time {target_start}")
@@ -40,13 +42,40 @@ def rotate_sky(path_skd, target_start):
         logger.critical(f'The following skd file {skd.absolute()} was not found')
         raise FileNotFoundError(f'The following skd file {skd.absolute()} was not found')
 
-    # read original .skd
-    skd = []
-    with open(path_skd) as f:
-        skd = f.readlines()
+    # only the header of the original .skd is read to get the start time
+    with open_skd(path_skd) as f:
+        diff = gmst_difference(find_start_time(f), target_start)
 
+    # stream original .skd to new .skd file
+    out = output_path(path_skd, "_sky", compression)
+    logger.info(f"output new .skd file to {out.absolute()}")
+    write_skd(out, update_times(rotate_source_lines(iter_skd(path_skd), diff), target_start), compression)
+
+
+def rotate_sky_skd(skd, target_start):
+    """
+    rotate source right ascension of skd file and change start time
+
+    :param skd: skd file
+    :param target_start: new session start day and time
+    :return: updated copy of skd file (the passed skd file is not changed)
+    """
+    diff = gmst_difference(find_start_time(skd), target_start)
+    skd = rotate_sources(skd, diff)
+
+    # update .skd file with new times
+    return update_skd_times(skd, target_start)
+
+
+def gmst_difference(original_start_time, target_start):
+    """
+    GMST difference between original and new start time
+
+    :param original_start_time: original session start time
+    :param target_start: new session start day and time
+    :return: GMST difference in hours
+    """
     # get GMST of original start and new start time
-    original_start_time = find_start_time(skd)
     apy_time_start = Time(original_start_time, scale='utc')
     sidereal_original_start_time = apy_time_start.sidereal_time('mean', 'greenwich')
 
@@ -56,16 +85,7 @@ def rotate_sky(path_skd, target_start):
     diff = (sidereal_original_target_time - sidereal_original_start_time).value
 
     logger.info(f"GMST difference is {diff} hours")
-    rotate_sources(skd, diff)
-
-    # update .skd file with new times
-    update_skd_times(skd, target_start)
-
-    # write new .skd file
-    out = path_skd.parent / f"{path_skd.stem}_sky.skd"
-    logger.info(f"output new .skd file to {out.absolute()}")
-    with open(out, 'w') as f:
-        f.write("".join(skd))
+    return diff
 
 
 def rotate_sources(skd, diff):
@@ -74,10 +94,21 @@ def rotate_sources(skd, diff):
 
     :param skd: skd file
     :param diff: angle to rotate right ascension
-    :return:
+    :return: updated copy of skd file (the passed skd file is not changed)
+    """
+    return list(rotate_source_lines(skd, diff))
+
+
+def rotate_source_lines(lines, diff):
+    """
+    change right ascension of sources line by line (see rotate_sources)
+
+    :param lines: iterable of lines
+    :param diff: angle to rotate right ascension
+    :return: generator of updated lines
     """
     source_block = False
-    for idx, l in enumerate(skd):
+    for l in lines:
         if l.strip().startswith("$"):
             if l.startswith("$SOURCE"):
                 source_block = True
@@ -105,11 +136,10 @@ def rotate_sources(skd, diff):
             target_second_str = f"{target_hms * 3600 % 60:.5f}"
 
             # update entry
-            skd[idx] = l[:orig_hour_grp[0]] + target_hour_str + l[orig_hour_grp[1]:orig_minute_grp[0]] + \
-                       target_minute_str + l[orig_minute_grp[1]:orig_second_grp[0]] + target_second_str + \
-                       l[orig_second_grp[1]:]
-
-            pass
+            l = l[:orig_hour_grp[0]] + target_hour_str + l[orig_hour_grp[1]:orig_minute_grp[0]] + \
+                target_minute_str + l[orig_minute_grp[1]:orig_second_grp[0]] + target_second_str + \
+                l[orig_second_grp[1]:]
+        yield l
 
 
 if __name__ == "__main__":
@@ -0,0 +1,188 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+import csv
+import datetime
+import io
+import json
+import re
+from pathlib import Path
+
+from astropy.time import Time
+
+from util import logger, open_skd, read_header
+
+# columns of inspect output
+FIELDS = ["file", "experiment", "start", "end", "duration", "gmst", "scans", "sources"]
+
+# number of bytes read at once when counting scans and sources
+CHUNK_SIZE = 1 << 20
+
+
+def inspect_skd(path_skd):
+    """
+    summarize a .skd file without parsing it completely (see inspect_files)
+
+    :param path_skd: path to .skd file
+    :return: dictionary with keys of FIELDS
+    """
+    return inspect_files([path_skd])[0]
+
+
+def inspect_directory(directory):
+    """
+    summarize all .skd files (possibly compressed) in a directory (see inspect_files)
+
+    :param directory: directory with .skd files
+    :return: list of dictionaries with keys of FIELDS
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        logger.critical(f'The following directory {directory.absolute()} was not found')
+        raise FileNotFoundError(f'The following directory {directory.absolute()} was not found')
+    files = [p for p in sorted(directory.iterdir()) if p.is_file() and re.search(r"\.skd(\.(gz|xz|zst))?$", p.name)]
+    return inspect_files(files)
+
+
+def inspect_files(files):
+    """
+    summarize .skd files
+
+    experiment name, session start and end are read from the header only (reading stops as soon as they are found),
+    number of scans and sources are counted on byte level and GMST of all session starts is computed at once
+
+    :param files: list of paths to .skd files
+    :return: list of dictionaries with keys of FIELDS
+    """
+    summaries = []
+    for path_skd in files:
+        path_skd = Path(path_skd)
+        if not path_skd.is_file():
+            logger.critical(f'The following skd file {path_skd.absolute()} was not found')
+            raise FileNotFoundError(f'The following skd file {path_skd.absolute()} was not found')
+
+        experiment, start, end = read_header(path_skd)
+        scans, sources = count_scans_and_sources(path_skd)
+        summaries.append({"file": str(path_skd),
+                          "experiment": experiment,
+                          "start": start,
+                          "end": end,
+                          "duration": (end - start).total_seconds() / 3600 if start and end else None,
+                          "gmst": None,
+                          "scans": scans,
+                          "sources": sources,
+                          })
+
+    starts = [s for s in summaries if s["start"] is not None]
+    if starts:
+        gmst = Time([s["start"] for s in starts], scale='utc').sidereal_time('mean', 'greenwich')
+        for summary, g in zip(starts, gmst.to_value('hourangle')):
+            summary["gmst"] = float(g)
+    return summaries
+
+
+def count_scans_and_sources(path_skd, chunk_size=CHUNK_SIZE):
+    """
+    count number of scans in $SKED block and number of sources in $SOURCES block on byte level
+
+    the file is read in chunks of complete lines (a line split by a chunk boundary is carried over to the next chunk),
+    scans are counted by searching the raw bytes, only the small $SOURCES block is split into lines. Reading stops
+    as soon as both blocks are complete.
+
+    :param path_skd: path to .skd file
+    :param chunk_size: number of bytes read at once (default = CHUNK_SIZE)
+    :return: number of scans, number of sources
+    """
+    counts = {b"$SKED": 0, b"$SOURCES": 0}
+    done = set()
+    block = None
+    tail = b""
+    with open_skd(path_skd, 'rb') as f:
+        while len(done) < len(counts):
+            chunk = f.read(chunk_size)
+            data = tail + chunk
+            if chunk:
+                cut = data.rfind(b"\n") + 1
+                data, tail = data[:cut], data[cut:]
+            block = _count_lines(data, block, counts, done)
+            if not chunk:
+                break
+    return counts[b"$SKED"], counts[b"$SOURCES"]
+
+
+def _count_lines(data, block, counts, done):
+    """
+    count scans ("PREOB") of $SKED block and non-empty lines of $SOURCES block in complete lines
+
+    only the first occurrence of each block is counted
+
+    :param data: complete lines
+    :param block: block of first line (block header of previous chunk)
+    :param counts: counts per block header, updated in place
+    :param done: set of completed blocks, updated in place
+    :return: block of last line
+    """
+    pos = 0
+    while pos < len(data):
+        if data.startswith(b"$", pos):
+            if block is not None:
+                done.add(block)
+            eol = data.find(b"\n", pos)
+            eol = len(data) if eol == -1 else eol + 1
+            name = data[pos:eol].split(maxsplit=1)[0]
+            block = name if name in counts and name not in done else None
+            pos = eol
+            continue
+
+        end = data.find(b"\n$", pos)
+        end = len(data) if end == -1 else end + 1
+        if block == b"$SKED":
+            counts[block] += data.count(b"PREOB", pos, end)
+        elif block == b"$SOURCES":
+            counts[block] += sum(1 for l in data[pos:end].splitlines() if l.strip())
+        pos = end
+    return block
+
+
+def write_summaries(summaries, fmt="json", f=None):
+    """
+    write summaries as JSON or CSV
+
+    :param summaries: list of dictionaries with keys of FIELDS
+    :param fmt: output format ['json', 'csv'] (default = 'json')
+    :param f: file object (default = string is returned)
+    :return: output as string if f is None
+    """
+    out = f if f is not None else io.StringIO()
+    rows = [{k: (v.isoformat() if isinstance(v, datetime.datetime) else v) for k, v in s.items()} for s in summaries]
+    if fmt == "json":
+        json.dump(rows, out, indent=1)
+        out.write("\n")
+    elif fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        raise ValueError(f"format '{fmt}' not supported")
+    if f is None:
+        return out.getvalue()
+
+
+if __name__ == "__main__":
+    from util import initialize_logging
+
+    initialize_logging()
+    print(write_summaries(inspect_directory(Path('test'))))
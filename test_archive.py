@@ -0,0 +1,81 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+
+def test_index_and_query(tmp_path):
+    from archive import build_index, query_index
+    from rotate import find_scans, find_wrap_point
+    from util import read_skd, write_skd
+    from pathlib import Path
+    from astropy.time import Time
+    import datetime
+    import numpy as np
+
+    write_skd(tmp_path / 'vt1176.skd', read_skd(Path('test/vt1176.skd')))
+    write_skd(tmp_path / 'vo1189.skd.gz', read_skd(Path('test/vo1189.skd')), "gz")
+    # outputs of this tool are not indexed
+    write_skd(tmp_path / 'vo1189_rot.skd', read_skd(Path('test/vo1189.skd')))
+    path_index = build_index(tmp_path)
+    assert path_index.is_file()
+
+    # GMST preserving start of vt1176 on another day needs no shift
+    target = datetime.datetime(2021, 6, 25, 18, 30, 0)
+    candidates = query_index(tmp_path, target, "gmst")
+    assert [Path(c["file"]).name for c in candidates] == ["vt1176.skd", "vo1189.skd.gz"]
+    assert candidates[0]["score"] < 1 / 3600
+
+    # only sessions of at least one sidereal day can be rotated, score matches rotation point
+    target = datetime.datetime(2021, 9, 1, 3, 17, 0)
+    candidates = query_index(tmp_path, target, "rotate")
+    assert [Path(c["file"]).name for c in candidates] == ["vo1189.skd.gz"]
+    scan_times, durations = find_scans(read_skd(Path('test/vo1189.skd')))
+    seconds = np.array([(t - scan_times[0]).total_seconds() for t in scan_times])
+    gmst = Time(scan_times, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+    target_gmst = Time(target, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+    first, _, _ = find_wrap_point(seconds, np.array(durations), gmst, target_gmst, 24)
+    offset = abs((gmst[first] - target_gmst + 12) % 24 - 12)
+    assert abs(candidates[0]["score"] - offset) <= 1 / 60
+
+    # removed files are removed from index
+    (tmp_path / 'vt1176.skd').unlink()
+    build_index(tmp_path)
+    assert [Path(c["file"]).name for c in query_index(path_index, target)] == ["vo1189.skd.gz"]
+
+
+def test_index_connections_closed(tmp_path, monkeypatch):
+    from archive import build_index, query_index
+    from util import read_skd, write_skd
+    from pathlib import Path
+    import archive
+    import datetime
+    import sqlite3
+    import pytest
+
+    connections = []
+    original_connect = sqlite3.connect
+
+    def connect(*args, **kwargs):
+        connections.append(original_connect(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(archive.sqlite3, "connect", connect)
+    write_skd(tmp_path / 'vt1176.skd', read_skd(Path('test/vt1176.skd')))
+    build_index(tmp_path)
+    query_index(tmp_path, datetime.datetime(2021, 9, 1, 3, 17, 0))
+    assert len(connections) == 2
+    for db in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            db.execute("SELECT 1")
@@ -0,0 +1,94 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+
+def test_transform_many():
+    from batch import transform, transform_many, APPROACHES
+    from pathlib import Path
+    import datetime
+
+    file = Path('test/vo1189.skd')
+    with open(file) as f:
+        skd = f.readlines()
+    original = list(skd)
+
+    jobs = [(skd, approach, datetime.datetime(2021, month, 22, 18, 0, 0))
+            for approach in APPROACHES for month in range(1, 4)]
+    results = transform_many(jobs, max_workers=4)
+
+    # input is not changed and threaded results match serial results
+    assert skd == original
+    assert len(results) == len(jobs)
+    for (job_skd, approach, target), result in zip(jobs, results):
+        assert result == transform(job_skd, approach, target)
+        assert result != original
+
+
+def test_transform_unknown_approach():
+    from batch import transform
+    import datetime
+    import pytest
+
+    with pytest.raises(ValueError):
+        transform([], "unknown", datetime.datetime(2021, 1, 22, 18, 0, 0))
+
+
+def test_process_directory(tmp_path, monkeypatch):
+    from batch import process_directory, watch_directory, REGEX_INPUT
+    from pathlib import Path
+    import batch
+    import datetime
+    import json
+    import shutil
+
+    shutil.copy(Path('test/vt1176.skd'), tmp_path / 'vt1176.skd')
+    target = datetime.datetime(2021, 7, 1, 18, 0, 0)
+
+    assert process_directory(tmp_path, "sky", target) == [tmp_path / 'vt1176_sky.skd']
+    # outputs are up to date, content hash of unchanged files is not computed again
+    with monkeypatch.context() as m:
+        m.setattr(batch, "file_hash", None)
+        assert process_directory(tmp_path, "sky", target) == []
+    assert process_directory(tmp_path, "sky", target, force=True) == [tmp_path / 'vt1176_sky.skd']
+
+    # changed target, changed input and missing output are processed again
+    target = datetime.datetime(2021, 7, 2, 18, 0, 0)
+    assert process_directory(tmp_path, "sky", target) == [tmp_path / 'vt1176_sky.skd']
+    with open(tmp_path / 'vt1176.skd', 'a') as f:
+        f.write("\n")
+    assert process_directory(tmp_path, "sky", target) == [tmp_path / 'vt1176_sky.skd']
+    (tmp_path / 'vt1176_sky.skd').unlink()
+    assert process_directory(tmp_path, "sky", target) == [tmp_path / 'vt1176_sky.skd']
+
+    # new files are picked up, failing files do not stop processing
+    shutil.copy(Path('test/vo1189.skd'), tmp_path / 'vo1189.skd')
+    assert process_directory(tmp_path, "rotate", target) == [tmp_path / 'vo1189_rot.skd']
+    shutil.copy(Path('test/vo1189.skd'), tmp_path / 'vo1189_copy.skd')
+    watch_directory(tmp_path, "sky", target, interval=0, iterations=2)
+    assert (tmp_path / 'vo1189_copy_sky.skd').is_file()
+
+    # entries of deleted files are removed from manifest, manifest is replaced as a whole
+    (tmp_path / 'vo1189_copy.skd').unlink()
+    process_directory(tmp_path, "sky", target)
+    with open(tmp_path / batch.MANIFEST) as f:
+        assert sorted(json.load(f)) == ["vo1189.skd:rotate", "vo1189.skd:sky", "vt1176.skd:sky"]
+    assert not (tmp_path / f"{batch.MANIFEST}.tmp").exists()
+
+    # outputs of this tool are no inputs
+    for name in ["vt1176_sky.skd", "vt1176_rot_20210122180000.skd", "vt1176_sky_20210122180000_2.skd.gz",
+                 "vt1176_trim.skd.xz"]:
+        assert not REGEX_INPUT.match(name)
+    assert REGEX_INPUT.match("vt1176.skd.gz")
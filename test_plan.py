@@ -0,0 +1,57 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+
+def test_find_times_equal_gmst():
+    from astropy.coordinates import Angle
+    from astropy.time import Time
+    import datetime
+    from plan import find_times_equal_gmst
+
+    dates = [datetime.date(2021, 1, 1) + datetime.timedelta(days=d) for d in range(0, 365, 7)]
+    for hours in [0.01, 6.75, 12, 23.99]:
+        angle = Angle(hours, unit='hourangle')
+        times, offsets = find_times_equal_gmst(dates, angle)
+        assert len(times) >= len(dates)
+        for time in times:
+            assert time.date() in dates
+            new_angle = Time(time, scale='utc').sidereal_time('mean', 'greenwich')
+            diff = ((new_angle - angle).to_value('hourangle') + 12) % 24 - 12
+            assert abs(diff) * 3600 < 1
+        assert max(offsets) < 1
+
+
+def test_plan_gmst_start_times():
+    from plan import plan_gmst_start_times, parse_window
+    from pathlib import Path
+    import datetime
+    from util import find_start_time
+
+    file = Path('test/vt1176.skd')
+    windows = [parse_window("17:00-19:00")]
+    plan = plan_gmst_start_times(file, datetime.date(2021, 1, 1), datetime.date(2021, 12, 31), windows)
+    assert plan
+    for entry in plan:
+        assert datetime.time(17) <= entry["start"].time() < datetime.time(19)
+        assert entry["output"] is None
+
+    plan = plan_gmst_start_times(file, datetime.date(2021, 6, 20), datetime.date(2021, 6, 21), write=True)
+    assert len(plan) == 2
+    for entry in plan:
+        assert entry["output"].is_file()
+        with open(entry["output"]) as f:
+            assert find_start_time(f.readlines()) == entry["start"]
+        entry["output"].unlink()
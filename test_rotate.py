@@ -37,3 +37,91 @@ def test_rotate_schedule_2():
     file = Path('test/vt1176.skd')
     with pytest.raises(SessionTooShortException):
         rotate_schedule(file, datetime.datetime(2021, 1, 22, 18, 0, 0))
+
+
+def test_rotate_schedule_3(tmp_path):
+    from rotate import rotate_schedule, find_scans
+    from trim import trim_schedule
+    from util import read_skd, find_start_time, find_end_time
+    from pathlib import Path
+    from astropy.time import Time
+    import datetime
+    import shutil
+    import numpy as np
+
+    # session that is shorter than 24 hours but covers one sidereal day
+    shutil.copy(Path('test/vo1189.skd'), tmp_path / 'vo1189.skd')
+    file = trim_schedule(tmp_path / 'vo1189.skd', datetime.datetime(2021, 7, 8, 18, 0, 0),
+                         datetime.datetime(2021, 7, 9, 17, 57, 0))
+    scan_times, _ = find_scans(read_skd(file))
+
+    target = datetime.datetime(2021, 1, 22, 18, 0, 0)
+    rotate_schedule(file, target)
+    new_skd = read_skd(tmp_path / 'vo1189_trim_rot.skd')
+    new_scan_times, new_durations = find_scans(new_skd)
+    assert new_scan_times[0] == target
+    assert find_start_time(new_skd) == target
+    # scans overlapping the wrap are removed, session ends with last scan
+    assert len(new_scan_times) < len(scan_times)
+    assert find_end_time(new_skd) == new_scan_times[-1] + datetime.timedelta(seconds=new_durations[-1])
+
+    # every scan keeps GMST of an original scan up to the offset of the first scan
+    gmst = Time(scan_times, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+    new_gmst = Time(new_scan_times, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+    diff = (new_gmst[:, None] - gmst[None, :] + 12) % 24 - 12
+    offset = diff[0, np.argmin(np.abs(diff[0]))]
+    assert abs(offset) < 300 / 3600
+    assert np.all(np.abs(diff - offset).min(axis=1) < 1 / 3600)
+
+
+def test_find_wrap_point():
+    from rotate import rotate_schedule_skd, find_scans, find_wrap_point
+    from util import read_skd, find_end_time
+    from pathlib import Path
+    from astropy.time import Time
+    import datetime
+    import numpy as np
+
+    skd = read_skd(Path('test/vo1189.skd'))
+    scan_times, durations = find_scans(skd)
+    target = datetime.datetime(2021, 9, 1, 3, 17, 0)
+    seconds = np.array([(t - scan_times[0]).total_seconds() for t in scan_times])
+    gmst = Time(scan_times, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+    target_gmst = Time(target, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+    first, keep, period = find_wrap_point(seconds, np.array(durations), gmst, target_gmst, 24)
+    assert period == 86164
+    assert 0 < first < keep < len(scan_times)
+
+    new_skd = rotate_schedule_skd(skd, target)
+    new_scan_times, new_durations = find_scans(new_skd)
+    assert new_scan_times[0] == target
+    assert find_end_time(new_skd) == new_scan_times[-1] + datetime.timedelta(seconds=new_durations[-1])
+
+    # new schedule is rotated original schedule, every scan keeps its GMST up to the offset of the first scan
+    assert len(new_scan_times) == keep
+    original = np.concatenate([gmst[first:keep], gmst[:first]])
+    new_gmst = Time(new_scan_times, scale='utc').sidereal_time('mean', 'greenwich').to_value('hourangle')
+    diff = (new_gmst - original + 12) % 24 - 12
+    assert np.all(np.abs(diff - diff[0]) < 1 / 3600)
+
+    # no overlapping scans at the wrap
+    wrap = keep - first
+    assert new_scan_times[wrap - 1] + datetime.timedelta(seconds=new_durations[wrap - 1]) <= new_scan_times[wrap]
+
+
+def test_plan_rotation():
+    from rotate import plan_rotation
+    import datetime
+
+    # 36 hour session with a scan every 2 minutes, only one sidereal day can be rotated
+    start = datetime.datetime(2021, 7, 1, 17, 0, 0)
+    scan_times = [start + datetime.timedelta(seconds=120 * i) for i in range(1080)]
+    durations = [60.0] * len(scan_times)
+    target = datetime.datetime(2021, 8, 1, 12, 0, 0)
+    first, period, drop, new_end = plan_rotation(start, start + datetime.timedelta(hours=36), scan_times, durations,
+                                                 target)
+    assert period == 86164
+    assert first < drop
+    # session ends with last scan of second block (last scan before new first scan)
+    assert new_end == target + (scan_times[scan_times.index(first) - 1] - first) + datetime.timedelta(seconds=period + 60)
+    assert new_end - target < datetime.timedelta(days=1)
@@ -0,0 +1,103 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+
+def test_shared_schedule():
+    from shared import SharedSchedule
+    from batch import transform
+    from util import read_skd
+    from pathlib import Path
+    import datetime
+    import io
+
+    for file, approaches in [('test/vt1176.skd', ["gmst", "sky"]), ('test/vo1189.skd', ["gmst", "sky", "rotate"])]:
+        skd = read_skd(Path(file))
+        schedule = SharedSchedule.create(skd)
+        attached = SharedSchedule.attach(schedule.descriptor)
+        try:
+            for approach in approaches:
+                for month in [1, 6, 11]:
+                    target = datetime.datetime(2021, month, 22, 7 * month % 24, 13, 0)
+                    f = io.BytesIO()
+                    attached.write(f, approach, target)
+                    assert f.getvalue() == "".join(transform(skd, approach, target)).encode()
+        finally:
+            attached.close()
+            schedule.close()
+            schedule.unlink()
+
+
+def test_sweep(tmp_path):
+    from shared import sweep
+    from batch import transform
+    from rotate import SessionTooShortException
+    from util import read_skd
+    from pathlib import Path
+    import datetime
+    import shutil
+    import pytest
+
+    file = tmp_path / 'vo1189.skd'
+    shutil.copy(Path('test/vo1189.skd'), file)
+    skd = read_skd(file)
+    targets = [datetime.datetime(2021, month, 22, 18, 0, 0) for month in range(1, 5)]
+
+    outs = sweep(file, "rotate", targets, compression="gz", max_workers=2)
+    assert outs == [tmp_path / f"vo1189_rot_2021{month:02d}22180000.skd.gz" for month in range(1, 5)]
+    for target, out in zip(targets, outs):
+        assert read_skd(out) == transform(skd, "rotate", target)
+
+    shutil.copy(Path('test/vt1176.skd'), tmp_path / 'vt1176.skd')
+    with pytest.raises(SessionTooShortException):
+        sweep(tmp_path / 'vt1176.skd', "rotate", targets, max_workers=2)
+
+
+def test_sweep_archive(tmp_path):
+    from shared import sweep
+    from rotate import SessionTooShortException
+    from batch import transform
+    from util import read_skd
+    from pathlib import Path
+    import datetime
+    import json
+    import tarfile
+    import zipfile
+    import pytest
+
+    skd = read_skd(Path('test/vt1176.skd'))
+    targets = [datetime.datetime(2021, month, 22, 18, 0, 0) for month in range(1, 4)]
+    targets.append(targets[0])
+
+    names = sweep(Path('test/vt1176.skd'), "sky", targets, max_workers=2, archive=tmp_path / "out.zip")
+    assert names[-1] == "vt1176_sky_20210122180000_2.skd"
+    assert len(set(names)) == len(targets)
+    with zipfile.ZipFile(tmp_path / "out.zip") as z:
+        assert z.namelist() == names + ["index.json"]
+        index = json.loads(z.read("index.json"))
+        for target, name, entry in zip(targets, names, index):
+            assert entry["member"] == name
+            assert entry["target"] == target.isoformat()
+            assert z.read(name).decode() == "".join(transform(skd, "sky", target))
+
+    names = sweep(Path('test/vt1176.skd'), "gmst", targets[:2], archive=tmp_path / "out.tar.gz")
+    with tarfile.open(tmp_path / "out.tar.gz") as t:
+        assert t.getnames() == names + ["index.json"]
+        assert t.extractfile(names[1]).read().decode() == "".join(transform(skd, "gmst", targets[1]))
+
+    # failed sweep does not leave an archive behind
+    with pytest.raises(SessionTooShortException):
+        sweep(Path('test/vt1176.skd'), "rotate", targets[:2], archive=tmp_path / "failed.zip")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["out.tar.gz", "out.zip"]
@@ -0,0 +1,71 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+
+def test_inspect_skd():
+    from summary import inspect_skd
+    from pathlib import Path
+    from astropy.time import Time
+    from util import read_skd, find_start_time, find_end_time, REGEX_SKED
+
+    for file in [Path('test/vt1176.skd'), Path('test/vo1189.skd')]:
+        skd = read_skd(file)
+        summary = inspect_skd(file)
+
+        start = find_start_time(skd)
+        assert summary["experiment"] == skd[0].split()[1]
+        assert summary["start"] == start
+        assert summary["end"] == find_end_time(skd)
+        assert summary["duration"] == (summary["end"] - start).total_seconds() / 3600
+        gmst = Time(start, scale='utc').sidereal_time('mean', 'greenwich')
+        assert abs(summary["gmst"] - gmst.to_value('hourangle')) < 1e-9
+
+        sked = skd[skd.index("$SKED\n") + 1:]
+        sked = sked[:next(i for i, l in enumerate(sked) if l.startswith("$"))]
+        assert summary["scans"] == sum(1 for l in sked if REGEX_SKED.search(l))
+
+    assert inspect_skd(Path('test/vt1176.skd'))["sources"] == 72
+    assert inspect_skd(Path('test/vo1189.skd'))["sources"] == 92
+
+
+def test_inspect_directory(tmp_path):
+    from summary import inspect_directory, inspect_skd, write_summaries
+    from util import read_skd, write_skd
+    from pathlib import Path
+    import csv
+    import io
+    import json
+
+    write_skd(tmp_path / 'vt1176.skd.gz', read_skd(Path('test/vt1176.skd')), "gz")
+    write_skd(tmp_path / 'vo1189.skd', read_skd(Path('test/vo1189.skd')))
+    summaries = inspect_directory(tmp_path)
+    assert [s["experiment"] for s in summaries] == ["VO1189", "VT1176"]
+    assert summaries[1]["scans"] == inspect_skd(Path('test/vt1176.skd'))["scans"]
+
+    rows = json.loads(write_summaries(summaries, "json"))
+    assert rows[0]["start"] == "2021-07-08T18:00:00"
+    rows = list(csv.DictReader(io.StringIO(write_summaries(summaries, "csv"))))
+    assert rows[1]["sources"] == "72"
+
+
+def test_count_scans_and_sources():
+    from summary import count_scans_and_sources
+    from pathlib import Path
+
+    # lines split by chunk boundaries are counted once
+    for file, counts in [(Path('test/vt1176.skd'), (158, 72)), (Path('test/vo1189.skd'), (1591, 92))]:
+        for chunk_size in [7, 64, 1000]:
+            assert count_scans_and_sources(file, chunk_size) == counts
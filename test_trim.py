@@ -0,0 +1,76 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+
+def test_scan_index():
+    from trim import ScanIndex
+    from util import read_skd, REGEX_SKED
+    from pathlib import Path
+    import datetime
+
+    skd = read_skd(Path('test/vo1189.skd'))
+    index = ScanIndex(skd)
+    t0 = datetime.datetime(2021, 7, 8, 20, 0, 0)
+    t1 = datetime.datetime(2021, 7, 8, 21, 0, 0)
+
+    # compare with linear search
+    expected = []
+    for idx in range(index.sked[0], index.sked[1]):
+        match = REGEX_SKED.search(skd[idx])
+        start = datetime.datetime.strptime(match.group(1), '%y%j%H%M%S')
+        end = start + datetime.timedelta(seconds=float(skd[idx].split()[5]))
+        if t0 <= start and end <= t1:
+            expected.append(idx)
+    assert list(index.window(t0, t1)) == expected
+    assert len(index.window(t1, t0)) == 0
+    assert len(index.window(t0 - datetime.timedelta(days=1), t1 + datetime.timedelta(days=1))) == len(index.line)
+
+
+def test_trim_schedule(tmp_path):
+    from trim import trim_schedule, extract_window, ScanIndex
+    from sky import REGEX_SOURCE
+    from util import read_skd, find_start_time, find_end_time, REGEX_SKED
+    from pathlib import Path
+    import datetime
+    import shutil
+
+    file = tmp_path / 'vo1189.skd'
+    shutil.copy(Path('test/vo1189.skd'), file)
+    t0 = datetime.datetime(2021, 7, 9, 6, 0, 0)
+    t1 = datetime.datetime(2021, 7, 9, 7, 0, 0)
+    out = trim_schedule(file, t0, t1)
+    assert out == tmp_path / 'vo1189_trim.skd'
+
+    skd = read_skd(out)
+    assert find_start_time(skd) == t0
+    assert find_end_time(skd) == t1
+    scans = [l for l in skd if REGEX_SKED.search(l) and not l.startswith("FREQUENCY")]
+    assert len(scans) == len(ScanIndex(read_skd(file)).window(t0, t1))
+    used = {l.split()[0] for l in scans}
+    block = skd[skd.index("$SOURCES\n") + 1:]
+    block = block[:next(i for i, l in enumerate(block) if l.startswith("$"))]
+    # sources are referenced by IAU name or common name
+    names = [set(l.split()[:2]) for l in block if REGEX_SOURCE.search(l)]
+    assert all(n & used for n in names)
+    assert used <= set.union(*names)
+    assert len(names) < len([l for l in read_skd(file) if REGEX_SOURCE.search(l)])
+
+    # move extracted schedule to new date
+    target = datetime.datetime(2022, 1, 1, 12, 0, 0)
+    skd = read_skd(file)
+    moved = extract_window(skd, ScanIndex(skd), t0, t1, target)
+    assert find_start_time(moved) == target
+    assert find_end_time(moved) == target + (t1 - t0)
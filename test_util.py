@@ -0,0 +1,131 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+
+def test_compressed_skd(tmp_path):
+    from util import read_skd, write_skd, detect_compression
+    from pathlib import Path
+    import pytest
+
+    skd = read_skd(Path('test/vt1176.skd'))
+    for compression in ["gz", "xz", "zst"]:
+        if compression == "zst":
+            pytest.importorskip("zstandard")
+        file = tmp_path / f"vt1176.skd.{compression}"
+        write_skd(file, skd, compression)
+        assert detect_compression(file) == compression
+        assert read_skd(file) == skd
+
+        # detection based on magic bytes
+        renamed = file.rename(tmp_path / "vt1176")
+        assert detect_compression(renamed) == compression
+        assert read_skd(renamed) == skd
+
+    assert detect_compression(Path('test/vt1176.skd')) is None
+
+
+def test_output_path():
+    from util import output_path
+    from pathlib import Path
+
+    assert output_path(Path('test/vt1176.skd'), "_gmst") == Path('test/vt1176_gmst.skd')
+    assert output_path(Path('test/vt1176.skd.gz'), "_gmst") == Path('test/vt1176_gmst.skd')
+    assert output_path(Path('test/vt1176.skd'), "_sky", "xz") == Path('test/vt1176_sky.skd.xz')
+
+
+def test_update_based_on_gmst_compressed(tmp_path):
+    from gmst import update_based_on_gmst
+    from util import read_skd, write_skd, find_start_time
+    import datetime
+
+    skd = read_skd('test/vt1176.skd')
+    file = tmp_path / "vt1176.skd.gz"
+    write_skd(file, skd, "gz")
+
+    update_based_on_gmst(file, datetime.date(2021, 6, 22), "xz")
+    new_file = tmp_path / "vt1176_gmst.skd.xz"
+    assert new_file.is_file()
+    assert find_start_time(read_skd(new_file)).date() == datetime.date(2021, 6, 22)
+
+
+def test_streamed_skd(tmp_path):
+    from gmst import update_based_on_gmst, update_skd_based_on_gmst
+    from sky import rotate_sky, rotate_sky_skd
+    from rotate import rotate_schedule, rotate_schedule_skd
+    from util import read_skd, write_skd
+    import datetime
+
+    # streaming from reader to writer gives same result as transforming the whole file in memory
+    target = datetime.datetime(2021, 3, 5, 11, 7, 0)
+    for name, function, transform, suffix, arg in [
+            ("vt1176", update_based_on_gmst, update_skd_based_on_gmst, "_gmst", target.date()),
+            ("vt1176", rotate_sky, rotate_sky_skd, "_sky", target),
+            ("vo1189", rotate_schedule, rotate_schedule_skd, "_rot", target)]:
+        skd = read_skd(f'test/{name}.skd')
+        file = tmp_path / f"{name}.skd.gz"
+        write_skd(file, iter(skd), "gz")
+        function(file, arg, "xz")
+        assert read_skd(tmp_path / f"{name}{suffix}.skd.xz") == transform(skd, arg)
+
+
+def test_configure_iers_offline():
+    import subprocess
+    import sys
+    import time
+
+    # run in a new process, as IERS tables are loaded only once per process
+    script = """
+import datetime
+import socket
+
+
+def blocked(*args, **kwargs):
+    raise OSError("network blocked")
+
+
+socket.socket.connect = blocked
+socket.create_connection = blocked
+
+import pytest
+from astropy.utils.iers import IERSRangeError
+from gmst import update_skd_based_on_gmst
+from sky import rotate_sky_skd
+from util import configure_iers, read_skd, find_start_time
+
+skd = read_skd('test/vt1176.skd')
+configure_iers(download=False, out_of_range="ignore")
+assert find_start_time(update_skd_based_on_gmst(skd, datetime.date(2021, 6, 22))).date() == datetime.date(2021, 6, 22)
+rotate_sky_skd(skd, datetime.datetime(2045, 1, 1, 18, 0, 0))
+
+configure_iers(download=False, out_of_range="error")
+with pytest.raises(IERSRangeError):
+    rotate_sky_skd(skd, datetime.datetime(2045, 1, 1, 18, 0, 0))
+
+# default table is restored lazily, nothing is opened or downloaded until it is used
+from astropy.utils import iers
+iers.IERS_Auto.open = classmethod(lambda cls, *args, **kwargs: pytest.fail("IERS table opened"))
+configure_iers()
+# out of range policy is left unchanged if it is not passed
+assert iers.conf.iers_degraded_accuracy == "error"
+configure_iers(out_of_range="ignore")
+configure_iers()
+assert iers.conf.iers_degraded_accuracy == "ignore"
+"""
+    start = time.time()
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert "download" not in result.stderr.lower()
+    assert time.time() - start < 60
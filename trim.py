@@ -0,0 +1,159 @@
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+#  Copyright (c) 2021.
+#  This program is free software: you can redistribute it and/or it under the
+#  terms of the GNU General Public License as published by the Free Software
+#  Foundation, either version 3 of the License, or (at your option) any later
+#  version.
+#
+#  This program is distributed in the hope that it will be useful, but WITHOUT
+#  ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+#  FOR A PARTICULAR PURPOSE.
+#  See the GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+import datetime
+from pathlib import Path
+
+import numpy as np
+
+from util import logger, read_skd, write_skd, output_path, update_skd_times, replace_time, REGEX_START, REGEX_END, \
+    REGEX_SKED
+
+
+class ScanIndex:
+    """
+    interval index over scans of $SKED block
+
+    scans are sorted by start time, thus, the scans of a time window are found by bisection
+    """
+
+    def __init__(self, skd):
+        """
+        build index
+
+        :param skd: skd file
+        """
+        starts = []
+        durations = []
+        lines = []
+        sked_block = False
+        self.sked = [None, len(skd)]
+        for idx, l in enumerate(skd):
+            if l.strip().startswith("$"):
+                if l.startswith("$SKED"):
+                    sked_block = True
+                    self.sked[0] = idx + 1
+                elif sked_block:
+                    sked_block = False
+                    self.sked[1] = idx
+
+            if sked_block and REGEX_SKED.search(l):
+                match = REGEX_SKED.search(l)
+                starts.append(datetime.datetime.strptime(match.group(1), '%y%j%H%M%S'))
+                durations.append(int(float(l.split()[5])))
+                lines.append(idx)
+        if self.sked[0] is None:
+            self.sked = [len(skd), len(skd)]
+
+        order = np.argsort(np.array(starts, dtype='datetime64[s]'), kind='stable')
+        self.start = np.array(starts, dtype='datetime64[s]')[order]
+        self.end = self.start + np.array(durations, dtype='timedelta64[s]')[order]
+        self.line = np.array(lines, dtype=np.int64)[order]
+
+    def window(self, t0, t1):
+        """
+        lines of all scans within time window [t0, t1)
+
+        scans have to start at or after t0 and must end before or at t1
+
+        :param t0: window start
+        :param t1: window end
+        :return: sorted line indices
+        """
+        t0 = np.datetime64(t0, 's')
+        t1 = np.datetime64(t1, 's')
+        lo = np.searchsorted(self.start, t0, side='left')
+        hi = np.searchsorted(self.start, t1, side='left')
+        inside = self.end[lo:hi] <= t1
+        return np.sort(self.line[lo:hi][inside])
+
+
+def trim_schedule(path_skd, t0, t1, target_start=None, compression=None):
+    """
+    extract all scans of time window [t0, t1) of .skd file
+    new .skd file will be stored in same folder as the input .skd file with "_trim" suffix (code_trim.skd)
+
+    :param path_skd: path to skd file that should be manipulated
+    :param t0: window start
+    :param t1: window end
+    :param target_start: move extracted schedule to new start time (default = None)
+    :param compression: compress new .skd file ['gz', 'xz', 'zst'] (default = None)
+    :return: path to new .skd file
+    """
+    logger.info(f"extracting scans between {t0} and {t1}")
+    skd = Path(path_skd)
+    if not skd.is_file():
+        logger.critical(f'The following skd file {skd.absolute()} was not found')
+        raise FileNotFoundError(f'The following skd file {skd.absolute()} was not found')
+
+    # read original .skd
+    skd = read_skd(path_skd)
+    skd = extract_window(skd, ScanIndex(skd), t0, t1, target_start)
+
+    # write new .skd file
+    out = output_path(path_skd, "_trim", compression)
+    logger.info(f"output new .skd file to {out.absolute()}")
+    write_skd(out, skd, compression)
+    return out
+
+
+def extract_window(skd, index, t0, t1, target_start=None):
+    """
+    extract all scans of time window [t0, t1) of skd file
+
+    session START and END are set to t0 and t1, sources that are no longer observed are removed from $SOURCES block
+
+    :param skd: skd file
+    :param index: ScanIndex of skd file
+    :param t0: window start
+    :param t1: window end
+    :param target_start: move extracted schedule to new start time (default = None)
+    :return: new skd file (the passed skd file is not changed)
+    """
+    lines = index.window(t0, t1)
+    logger.info(f"{len(lines)} of {len(index.line)} scans are between {t0} and {t1}")
+    sked_start, sked_end = index.sked
+    sked = [skd[idx] for idx in lines]
+    used = {l.split()[0] for l in sked}
+
+    new_skd = []
+    source_block = False
+    start_changed = False
+    end_changed = False
+    for l in skd[:sked_start] + sked + skd[sked_end:]:
+        if l.strip().startswith("$"):
+            source_block = l.startswith("$SOURCE")
+        elif source_block and l.strip() and not used.intersection(l.split()[:2]):
+            continue
+
+        if not start_changed and REGEX_START.search(l):
+            l = replace_time(REGEX_START, l, t0)
+            start_changed = True
+        if not end_changed and REGEX_END.search(l):
+            l = replace_time(REGEX_END, l, t1)
+            end_changed = True
+        new_skd.append(l)
+
+    if target_start is not None:
+        new_skd = update_skd_times(new_skd, target_start)
+    return new_skd
+
+
+if __name__ == "__main__":
+    from util import initialize_logging
+
+    initialize_logging()
+    trim_schedule(Path('test/vo1189.skd'), datetime.datetime(2021, 7, 8, 18), datetime.datetime(2021, 7, 8, 19))
@@ -15,16 +15,230 @@
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 import datetime
+import gzip
 import logging
+import lzma
 import re
+import threading
 from pathlib import Path
 
+__version__ = "1.1.0"
+
 logger = logging.getLogger('EOP_PCC')
+# settings passed to configure_iers (used to configure worker processes)
+IERS_SETTINGS = {}
+# IERS table set by configure_iers (context that restores the previous table)
+_iers_table = None
+# handlers added by initialize_logging
+_handlers = []
+_handlers_lock = threading.Lock()
 
 # some helper regex
 REGEX_START = re.compile(r"START\s+(\d{11})")
 REGEX_END = re.compile(r"END\s+(\d{11})")
 REGEX_SKED = re.compile(r"PREOB\s+(\d{11})")
+REGEX_EXPER = re.compile(r"^\$EXPER\s+(\S+)")
+
+# ratio of sidereal to solar time (sidereal hours per UTC hour)
+SIDEREAL_RATE = 1.00273790935
+# length of a sidereal day in seconds
+SIDEREAL_DAY = 86400 / SIDEREAL_RATE
+
+# supported compressions with file extension and magic bytes
+COMPRESSIONS = {"gz": (".gz", b"\x1f\x8b"),
+                "xz": (".xz", b"\xfd7zXZ\x00"),
+                "zst": (".zst", b"\x28\xb5\x2f\xfd"),
+                }
+
+
+def detect_compression(path):
+    """
+    detect compression of a file based on its extension or, if not available, its magic bytes
+
+    :param path: path to file
+    :return: compression ['gz', 'xz', 'zst'] or None if file is not compressed
+    """
+    path = Path(path)
+    for compression, (extension, _) in COMPRESSIONS.items():
+        if path.suffix == extension:
+            return compression
+
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    for compression, (_, magic) in COMPRESSIONS.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_skd(path, mode='r', compression=None):
+    """
+    open (possibly compressed) .skd file
+
+    data is decompressed/compressed on the fly while reading/writing
+
+    :param path: path to file
+    :param mode: 'r'/'w' for reading/writing in text mode, 'rb'/'wb' for binary mode
+    :param compression: compression ['gz', 'xz', 'zst'] or None; detected automatically when reading
+    :return: file object
+    """
+    if mode.startswith('r') and compression is None:
+        compression = detect_compression(path)
+
+    if compression is None:
+        return open(path, mode)
+    if 'b' not in mode:
+        mode += 't'
+    if compression == "gz":
+        return gzip.open(path, mode)
+    if compression == "xz":
+        return lzma.open(path, mode)
+    if compression == "zst":
+        try:
+            import zstandard
+        except ImportError:
+            logger.critical("zstd compression requires the 'zstandard' package")
+            raise
+        return zstandard.open(path, mode)
+    raise ValueError(f"unknown compression '{compression}'")
+
+
+def read_skd(path):
+    """
+    read (possibly compressed) .skd file
+
+    :param path: path to file
+    :return: list of lines
+    """
+    with open_skd(path) as f:
+        return f.readlines()
+
+
+def iter_skd(path):
+    """
+    read (possibly compressed) .skd file line by line
+
+    the file is closed once all lines are read
+
+    :param path: path to file
+    :return: generator of lines
+    """
+    with open_skd(path) as f:
+        yield from f
+
+
+def write_skd(path, skd, compression=None):
+    """
+    write (possibly compressed) .skd file
+
+    lines are written as they are generated, thus, skd can be a generator (e.g. update_times(iter_skd(path), ...))
+
+    :param path: path to file
+    :param skd: iterable of lines
+    :param compression: compression ['gz', 'xz', 'zst'] or None
+    :return: None
+    """
+    with open_skd(path, 'w', compression) as f:
+        f.writelines(skd)
+
+
+def output_path(path_skd, suffix, compression=None):
+    """
+    path of new .skd file stored in same folder as the input .skd file (code_suffix.skd)
+
+    compression extensions of the input file are ignored, a new one is added if compression is requested
+
+    :param path_skd: path to input .skd file
+    :param suffix: suffix added to session code (e.g. "_gmst")
+    :param compression: compression ['gz', 'xz', 'zst'] or None
+    :return: path to new .skd file
+    """
+    path_skd = Path(path_skd)
+    name = path_skd.name
+    for extension, _ in COMPRESSIONS.values():
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    stem = Path(name).stem
+    extension = COMPRESSIONS[compression][0] if compression else ""
+    return path_skd.parent / f"{stem}{suffix}.skd{extension}"
+
+
+def configure_iers(path=None, download=True, out_of_range=None):
+    """
+    configure IERS tables used by astropy to get UT1-UTC (required for GMST)
+
+    by default, astropy downloads up-to-date IERS tables on first use which might block on hosts without internet
+    access. If download is disabled, the passed IERS file (or, if no file is passed, the IERS-A file shipped with
+    astropy, or the bundled IERS-B file for astropy versions that do not ship IERS-A) is used.
+
+    the out_of_range policy defines what happens for times outside the range covered by the IERS table:
+    'error' raises an IERSRangeError, 'warn' continues with degraded accuracy and issues a warning,
+    'ignore' continues with degraded accuracy silently. Note that the GMST error is small (UT1-UTC < 0.9 sec).
+    If no policy is passed, astropy's policy is not changed ('error' by default).
+    The policy requires astropy's iers_degraded_accuracy option, it is ignored (with a warning) for older versions.
+
+    :param path: path to local IERS-A (finals2000A) or IERS-B (eopc04) file (default = None)
+    :param download: allow download of IERS tables (default = True)
+    :param out_of_range: policy for times outside the IERS table ['error', 'warn', 'ignore'] (default = None)
+    :return: None
+    """
+    from astropy.utils import iers
+
+    if out_of_range not in [None, "error", "warn", "ignore"]:
+        raise ValueError(f"unknown IERS out of range policy '{out_of_range}'")
+
+    IERS_SETTINGS.clear()
+    IERS_SETTINGS.update(path=path, download=download, out_of_range=out_of_range)
+
+    iers.conf.auto_download = download
+    if out_of_range is not None:
+        if hasattr(iers.conf, "iers_degraded_accuracy"):
+            iers.conf.iers_degraded_accuracy = out_of_range
+        else:
+            logger.warning(f"IERS out of range policy '{out_of_range}' is not supported by this astropy version")
+
+    if path is None and not download:
+        path = iers.IERS_A_FILE if Path(iers.IERS_A_FILE).is_file() else iers.IERS_B_FILE
+
+    # restore default table (opened lazily by astropy on first use) before a new one is set
+    global _iers_table
+    if _iers_table is not None:
+        _iers_table.__exit__(None, None, None)
+        _iers_table = None
+
+    if path is not None:
+        try:
+            table = iers.IERS_A.open(str(path))
+        except Exception:
+            table = iers.IERS_B.open(str(path))
+        _iers_table = iers.earth_orientation_table.set(table)
+        logger.info(f"using IERS table {path} (download = {download}, out of range = {out_of_range})")
+
+
+def read_header(path_skd):
+    """
+    read experiment name, session start and session end from header of .skd file
+
+    :param path_skd: path to .skd file
+    :return: experiment name, session start time, session end time
+    """
+    experiment = None
+    start = None
+    end = None
+    with open_skd(path_skd) as f:
+        for l in f:
+            if experiment is None and REGEX_EXPER.search(l):
+                experiment = REGEX_EXPER.search(l).group(1)
+            if start is None and REGEX_START.search(l):
+                start = datetime.datetime.strptime(REGEX_START.search(l).group(1), '%y%j%H%M%S')
+            if end is None and REGEX_END.search(l):
+                end = datetime.datetime.strptime(REGEX_END.search(l).group(1), '%y%j%H%M%S')
+            if experiment is not None and start is not None and end is not None:
+                break
+            # START and END are part of $PARAM block, no need to read further
+            if l.startswith("$") and not l.startswith(("$EXPER", "$PARAM")):
+                break
+    return experiment, start, end
 
 
 def find_start_time(skd):
@@ -59,6 +273,19 @@ def find_end_time(skd):
     return original_end_time
 
 
+def replace_time(regex, line, time):
+    """
+    replace time in string
+
+    :param regex: regex (where first group is time that should be changed)
+    :param line: string with time to be changed
+    :param time: new time
+    :return: string with updated time
+    """
+    idx = regex.search(line).regs[1]
+    return line[:idx[0]] + time.strftime('%y%j%H%M%S') + line[idx[1]:]
+
+
 def update_skd_times(skd, new_start_time, param=True, sked=True):
     """
     update times in .skd file
@@ -67,11 +294,26 @@ def update_skd_times(skd, new_start_time, param=True, sked=True):
     :param new_start_time: new start time
     :param param: update $PARAM block (default = True)
     :param sked: update $SKED block (default = True)
-    :return:
+    :return: updated copy of skd file (the passed skd file is not changed)
     """
-    # first step: find original start time
-    original_start_time = find_start_time(skd)
+    return list(update_times(skd, new_start_time, param, sked, find_start_time(skd)))
 
+
+def update_times(lines, new_start_time, param=True, sked=True, original_start_time=None):
+    """
+    update times of .skd file line by line (see update_skd_times)
+
+    lines are processed one at a time, thus, a .skd file can be streamed from reader to writer without keeping it in
+    memory. The original start time is taken from the first START entry if it is not passed (START is part of the
+    $PARAM block which comes before the $SKED block).
+
+    :param lines: iterable of lines
+    :param new_start_time: new start time
+    :param param: update $PARAM block (default = True)
+    :param sked: update $SKED block (default = True)
+    :param original_start_time: original session start time (default = None)
+    :return: generator of updated lines
+    """
     # some helper flags
     start_changed = False
     end_changed = False
@@ -94,17 +336,17 @@ def update_skd_times(skd, new_start_time, param=True, sked=True):
         time_str = datetime.datetime.strftime(tmp_new_time, '%y%j%H%M%S')
         return line[:idx[0]] + time_str + line[idx[1]:]
 
-    for idx, l in enumerate(skd):
+    for l in lines:
+        if original_start_time is None and REGEX_START.search(l):
+            original_start_time = datetime.datetime.strptime(REGEX_START.search(l).group(1), '%y%j%H%M%S')
 
         if param and not start_changed and REGEX_START.search(l):
             l = _update_time(REGEX_START, l)
             start_changed = True
-            skd[idx] = l
 
         if param and not end_changed and REGEX_END.search(l):
             l = _update_time(REGEX_END, l)
             end_changed = True
-            skd[idx] = l
 
         if l.strip().startswith("$"):
             if l.startswith("$SKED"):
@@ -114,8 +356,7 @@ def update_skd_times(skd, new_start_time, param=True, sked=True):
 
         if sked and sked_block and REGEX_SKED.search(l):
             l = _update_time(REGEX_SKED, l)
-            skd[idx] = l
-    pass
+        yield l
 
 
 def initialize_logging(severity_console="INFO", file=False, severity_file="DEBUG", outdir="logs", mode='w'):
@@ -123,6 +364,7 @@ def initialize_logging(severity_console="INFO", file=False, severity_file="DEBUG
     initialize logging environment
 
     in case level_str cannot be interpreted it will default to "DEBUG"
+    calling this function again replaces the handlers added by the previous call
     log file will be named: yyyy_mm_dd_hh_mm_ss.log
 
     :param severity_console: level [DEBUG, INFO, WARNING, ERROR, CRITICAL]
@@ -163,7 +405,15 @@ def initialize_logging(severity_console="INFO", file=False, severity_file="DEBUG
     ch = logging.StreamHandler()
     ch.setLevel(c_level)
     ch.setFormatter(formatter)
-    logger.addHandler(ch)
+
+    # replace handlers of previous calls to avoid duplicated log messages
+    with _handlers_lock:
+        for handler in _handlers:
+            logger.removeHandler(handler)
+            handler.close()
+        _handlers.clear()
+        logger.addHandler(ch)
+        _handlers.append(ch)
     logger.info(f"logging enabled (severity {c_level_str}+)")
 
     # create file handler
@@ -173,5 +423,7 @@ def initialize_logging(severity_console="INFO", file=False, severity_file="DEBUG
         fh = logging.FileHandler(out, mode=mode)
         fh.setLevel(f_level)
         fh.setFormatter(formatter)
-        logger.addHandler(fh)
+        with _handlers_lock:
+            logger.addHandler(fh)
+            _handlers.append(fh)
         logger.info(f"logs will be written to {out.absolute()} (severity: {f_level_str}+)")